@@ -0,0 +1,78 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+
+from app.domain.stream import Stream, StreamPage
+
+# Authenticated responses: browsers may keep them but must revalidate first
+CACHE_CONTROL = "private, no-cache"
+
+
+def _version_key(stream: Stream) -> str:
+    # Everything but viewer_count only changes together with updated_at
+    updated_at = stream.updated_at or stream.created_at
+    return f"{stream.id}|{updated_at.isoformat() if updated_at else ''}|{stream.viewer_count}"
+
+
+def _etag(parts: Iterable[str]) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\n")
+    return f'"{digest.hexdigest()}"'
+
+
+def stream_etag(stream: Stream) -> str:
+    return _etag([_version_key(stream)])
+
+
+def page_etag(page: StreamPage, fields: Optional[Iterable[str]] = None) -> str:
+    """Validator for one listing page: its items' versions, the cursor to
+    the next page and the projection, which changes the body as well."""
+    header = ",".join(fields) if fields is not None else "*"
+    return _etag([header, page.next_cursor or "", *(_version_key(stream) for stream in page.items)])
+
+
+def last_modified(stream: Stream) -> Optional[datetime]:
+    moment = stream.updated_at or stream.created_at
+    if moment is None:
+        return None
+    # Stored datetimes are naive UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    # If-Modified-Since is deliberately not honoured: viewer_count is part of
+    # every body and changes without updated_at, which is all Last-Modified
+    # can express. Clients revalidate with the ETag.
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and _etag_matches(if_none_match, etag)
+
+
+def set_validators(response: Response, etag: str, modified: Optional[datetime] = None) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if modified is not None:
+        response.headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    return response
+
+
+def not_modified_response(etag: str, modified: Optional[datetime] = None) -> Response:
+    return set_validators(Response(status_code=304), etag, modified)
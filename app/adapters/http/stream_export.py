@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+import zlib
+from dataclasses import asdict
+from datetime import datetime
+from typing import AsyncIterator
+
+from app.domain.stream import Stream
+from app.infrastructure.serialization import json_default
+
+CSV_COLUMNS = ("id", "title", "description", "is_live", "created_at", "updated_at", "viewer_count")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _ndjson_rows(streams: list[Stream]) -> str:
+    return "".join(
+        json.dumps(asdict(stream), default=json_default, separators=(",", ":")) + "\n"
+        for stream in streams
+    )
+
+
+def _csv_rows(streams: list[Stream]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for stream in streams:
+        row = asdict(stream)
+        writer.writerow([
+            row[column].isoformat() if isinstance(row[column], datetime) else row[column]
+            for column in CSV_COLUMNS
+        ])
+    return buffer.getvalue()
+
+
+async def encode_export(
+    streams: AsyncIterator[Stream],
+    fmt: str,
+    batch_size: int,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """Encode streams into NDJSON or CSV chunks of ``batch_size`` rows.
+
+    With ``compress`` every chunk is gzip-compressed and sync-flushed on its
+    own, so the client can decode it as soon as it arrives.
+    """
+    encode_rows = _csv_rows if fmt == "csv" else _ndjson_rows
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode()
+        if compressor is None:
+            return data
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    if fmt == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(CSV_COLUMNS)
+        yield emit(header.getvalue())
+
+    batch: list[Stream] = []
+    async for stream in streams:
+        batch.append(stream)
+        if len(batch) >= batch_size:
+            yield emit(encode_rows(batch))
+            batch = []
+    if batch:
+        yield emit(encode_rows(batch))
+    if compressor is not None:
+        yield compressor.flush()
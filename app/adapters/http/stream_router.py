@@ -1,12 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from dataclasses import replace
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from app.adapters.http.conditional import (
+    has_validators, is_not_modified, last_modified, not_modified_response, page_etag, set_validators,
+    stream_etag,
+)
+from app.adapters.http.stream_export import MEDIA_TYPES, encode_export
+from app.domain.analytics import StreamStats
+from app.usecase.analytics_service import AnalyticsService
+from app.usecase.presence_service import PresenceService
 from app.usecase.stream_service import StreamService
-from app.domain.stream import Stream
-from typing import List
-from app.di import get_stream_service
+from app.domain.stream import Stream, StreamBatchOp, PROJECTABLE_FIELDS
+from typing import Any, Dict, List, Literal, Optional
+from app.di import get_analytics_service, get_event_broker, get_presence_service, get_stream_service
+from app.infrastructure.events import InMemoryEventBroker, SubscriptionClosed, event_to_json
+from app.infrastructure.serialization import stream_page_response, stream_response
 from app.usecase.auth_service import AuthService
 
 router = APIRouter(prefix="/streams", tags=["Streams"])
 
+SSE_KEEPALIVE_SECONDS = 15
+MAX_BATCH_SIZE = 1000
+MAX_STATS_HOURS = 24 * 31
+# What page_etag needs from every item, whatever projection was asked for
+VERSION_FIELDS = ["updated_at", "viewer_count"]
+
+
+class StreamItemOut(BaseModel):
+    """A listed stream. With ?fields= only id, created_at and the requested
+    fields are present."""
+    id: str
+    created_at: datetime
+    title: Optional[str] = None
+    description: Optional[str] = None
+    is_live: Optional[bool] = None
+    updated_at: Optional[datetime] = None
+    viewer_count: Optional[int] = None
+
+
+class StreamPageOut(BaseModel):
+    items: List[StreamItemOut]
+    next_cursor: Optional[str] = None
+
+
+class StreamCreateIn(BaseModel):
+    title: str
+    description: str = ""
+
+
+class StreamBatchCreateIn(BaseModel):
+    items: List[StreamCreateIn] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    ordered: bool = True
+
+
+class StreamBatchOpIn(BaseModel):
+    op: Literal["update", "delete"]
+    id: str
+    data: Optional[Dict[str, Any]] = None
+
+
+class StreamBatchModifyIn(BaseModel):
+    operations: List[StreamBatchOpIn] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    ordered: bool = False
+
+
+class BatchItemOut(BaseModel):
+    index: int
+    ok: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResultOut(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemOut]
+
+
+def _batch_result(results) -> BatchResultOut:
+    items = [BatchItemOut(index=r.index, ok=r.ok, id=r.id, error=r.error) for r in results]
+    succeeded = sum(1 for item in items if item.ok)
+    return BatchResultOut(succeeded=succeeded, failed=len(items) - succeeded, results=items)
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[list[str]]:
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+    return names
+
 
 @router.post("/", response_model=Stream)
 async def create_stream(
@@ -15,20 +106,223 @@ async def create_stream(
     service: StreamService = Depends(get_stream_service),
     user = Depends(AuthService.get_current_user)
 ):
-    return await service.create_stream(title, description)
+    return stream_response(await service.create_stream(title, description))
+
+
+@router.post("/batch", response_model=BatchResultOut)
+async def create_streams_batch(
+    payload: StreamBatchCreateIn,
+    service: StreamService = Depends(get_stream_service),
+    user = Depends(AuthService.get_current_user)
+):
+    results = await service.create_streams(
+        [(item.title, item.description) for item in payload.items], ordered=payload.ordered
+    )
+    return _batch_result(results)
+
+
+@router.patch("/batch", response_model=BatchResultOut)
+async def modify_streams_batch(
+    payload: StreamBatchModifyIn,
+    service: StreamService = Depends(get_stream_service),
+    user = Depends(AuthService.get_current_user)
+):
+    for op in payload.operations:
+        if op.op == "update" and not op.data:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Update of {op.id} has no data",
+            )
+    ops = [StreamBatchOp(op=op.op, stream_id=op.id, data=op.data) for op in payload.operations]
+    results = await service.modify_streams(ops, ordered=payload.ordered)
+    return _batch_result(results)
+
+
+@router.get("/", response_model=StreamPageOut)
+async def list_streams(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    is_live: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+    service: StreamService = Depends(get_stream_service),
+    presence: PresenceService = Depends(get_presence_service),
+    user = Depends(AuthService.get_current_user)
+):
+    projection = _parse_fields(fields)
 
+    async def load(fields):
+        try:
+            page = await service.list_streams(
+                limit,
+                cursor=cursor,
+                is_live=is_live,
+                created_after=created_after,
+                created_before=created_before,
+                fields=fields,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        return replace(page, items=[presence.with_live_count(stream) for stream in page.items])
 
-@router.get("/", response_model=List[Stream])
-async def list_streams(service: StreamService = Depends(get_stream_service), user = Depends(AuthService.get_current_user)):
-    return await service.list_streams()
+    if has_validators(request):
+        # Validate against a projection-only read of the same page first
+        etag = page_etag(await load(VERSION_FIELDS), projection)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+    page = await load([*projection, *VERSION_FIELDS] if projection else None)
+    return set_validators(stream_page_response(page, projection), page_etag(page, projection))
+
+
+@router.get("/search", response_model=StreamPageOut)
+async def search_streams(
+    q: str = Query(..., min_length=1, max_length=200),
+    mode: Literal["text", "prefix"] = "text",
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    is_live: Optional[bool] = None,
+    service: StreamService = Depends(get_stream_service),
+    presence: PresenceService = Depends(get_presence_service),
+    user = Depends(AuthService.get_current_user)
+):
+    """Search titles and descriptions: "text" ranks by relevance, "prefix" matches title starts"""
+    try:
+        page = await service.search_streams(q, limit, mode=mode, cursor=cursor, is_live=is_live)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    page = replace(page, items=[presence.with_live_count(stream) for stream in page.items])
+    return stream_page_response(page)
+
+
+@router.get("/stats", response_model=StreamStats)
+async def stream_stats(
+    hours: int = Query(24, ge=1, le=MAX_STATS_HOURS),
+    analytics: AnalyticsService = Depends(get_analytics_service),
+    user = Depends(AuthService.get_current_user)
+):
+    """Hourly created/updated/deleted counts and the latest live/not-live split"""
+    return await analytics.stats(hours)
+
+
+@router.get("/export")
+async def export_streams(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    gzip: bool = False,
+    service: StreamService = Depends(get_stream_service),
+    user = Depends(AuthService.get_current_user)
+):
+    headers = {"Content-Disposition": f'attachment; filename="streams.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    body = encode_export(service.export_streams(batch_size), format, batch_size, compress=gzip)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+@router.get("/events")
+async def stream_events(
+    stream_id: Optional[List[str]] = Query(None),
+    broker: InMemoryEventBroker = Depends(get_event_broker),
+    user = Depends(AuthService.get_streaming_user)
+):
+    """Server-sent events fallback for clients that cannot open a WebSocket.
+    EventSource cannot send headers, so ?access_token= is accepted as well."""
+    subscription = broker.subscribe(stream_id)
+
+    async def body():
+        with subscription:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                except SubscriptionClosed:
+                    return
+                yield f"event: {event.type}\ndata: {event_to_json(event)}\n\n"
+
+    return StreamingResponse(
+        body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+
+@router.websocket("/ws")
+async def stream_events_ws(
+    websocket: WebSocket,
+    stream_id: Optional[List[str]] = Query(None),
+    access_token: Optional[str] = None,
+    broker: InMemoryEventBroker = Depends(get_event_broker),
+):
+    # Browsers cannot set headers on a WebSocket handshake
+    try:
+        AuthService.user_from_header_or_query(websocket.headers.get("authorization", ""), access_token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    async def wait_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    async def send_events(subscription):
+        while True:
+            event = await subscription.get()
+            await websocket.send_text(event_to_json(event))
+
+    with broker.subscribe(stream_id) as subscription:
+        receiver = asyncio.ensure_future(wait_disconnect())
+        sender = asyncio.ensure_future(send_events(subscription))
+        try:
+            await asyncio.wait([receiver, sender], return_when=asyncio.FIRST_COMPLETED)
+            disconnected = receiver.done()
+        finally:
+            for task in (receiver, sender):
+                task.cancel()
+            await asyncio.gather(receiver, sender, return_exceptions=True)
+        if subscription.dropped and not disconnected:
+            # Too slow to keep up; the client should reconnect and re-read state
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
 
 
 @router.get("/{stream_id}", response_model=Stream)
-async def get_stream(stream_id: str, service: StreamService = Depends(get_stream_service), user = Depends(AuthService.get_current_user)):
+async def get_stream(
+    stream_id: str,
+    request: Request,
+    service: StreamService = Depends(get_stream_service),
+    presence: PresenceService = Depends(get_presence_service),
+    user = Depends(AuthService.get_current_user)
+):
+    if has_validators(request):
+        version = await service.get_stream_version(stream_id)
+        if not version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream not found")
+        version = presence.with_live_count(version)
+        etag, modified = stream_etag(version), last_modified(version)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, modified)
+    stream = await service.get_stream(stream_id)
+    if not stream:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream not found")
+    stream = presence.with_live_count(stream)
+    return set_validators(stream_response(stream), stream_etag(stream), last_modified(stream))
+
+
+@router.post("/{stream_id}/heartbeat")
+async def heartbeat(
+    stream_id: str,
+    service: StreamService = Depends(get_stream_service),
+    presence: PresenceService = Depends(get_presence_service),
+    user = Depends(AuthService.get_current_user)
+):
+    # Served from the read cache in the common case, so this stays off Mongo
     stream = await service.get_stream(stream_id)
     if not stream:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream not found")
-    return stream
+    presence.heartbeat(stream_id, user)
+    return {"ok": True, "viewer_count": presence.with_live_count(stream).viewer_count}
 
 
 @router.put("/{stream_id}", response_model=Stream)
@@ -39,7 +333,7 @@ async def update_stream(
     updated = await service.update_stream(stream_id, data)
     if not updated:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream not found")
-    return updated
+    return stream_response(updated)
 
 
 @router.delete("/{stream_id}")
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+
+from app.domain.stream import (
+    BatchItemResult, Stream, StreamBatchOp, StreamPage, StreamRepository, ViewerReport,
+)
+from app.infrastructure.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+STREAM_CACHE_SIZE = int(os.getenv("STREAM_CACHE_SIZE", "10000"))
+STREAM_CACHE_TTL_SECONDS = float(os.getenv("STREAM_CACHE_TTL_SECONDS", "5"))
+STREAM_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("STREAM_CACHE_NEGATIVE_TTL_SECONDS", "1"))
+
+_MISSING = object()
+_NOT_FOUND = object()
+
+# Written by presence flushes; cached streams may lag on these by a TTL
+PRESENCE_FIELDS = ["viewers", "viewers_at", "heartbeat_count", "last_heartbeat_at"]
+
+# Change stream filter: replaces, deletes, and updates that touch anything
+# besides the presence fields (or their "viewers.<worker>" sub-paths).
+# $ifNull because $expr may be evaluated for events without updateDescription.
+_CHANGED_FIELDS = {"$concatArrays": [
+    {"$map": {
+        "input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}},
+        "in": "$$this.k",
+    }},
+    {"$ifNull": ["$updateDescription.removedFields", []]},
+]}
+_NON_PRESENCE_FIELDS = {"$filter": {
+    "input": _CHANGED_FIELDS,
+    "as": "field",
+    "cond": {"$not": [{"$or": [
+        {"$in": ["$$field", PRESENCE_FIELDS]},
+        {"$eq": [{"$substrCP": ["$$field", 0, 8]}, "viewers."]},
+    ]}]},
+}}
+CHANGE_STREAM_PIPELINE = [{"$match": {"$or": [
+    {"operationType": {"$in": ["replace", "delete"]}},
+    {"operationType": "update", "$expr": {"$gt": [{"$size": _NON_PRESENCE_FIELDS}, 0]}},
+]}}]
+
+
+class CachedStreamRepository(StreamRepository):
+    """Read-through cache for ``get_by_id`` in front of another repository.
+
+    Concurrent misses for the same id share one load, unknown ids are cached
+    for a shorter time, and writes through this repository invalidate the
+    entry. Writes made by other workers are only seen once the entry expires,
+    unless a ``ChangeStreamInvalidator`` is running.
+    """
+
+    def __init__(
+        self,
+        inner: StreamRepository,
+        max_size: int = STREAM_CACHE_SIZE,
+        ttl: float = STREAM_CACHE_TTL_SECONDS,
+        negative_ttl: float = STREAM_CACHE_NEGATIVE_TTL_SECONDS,
+    ):
+        self.inner = inner
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(max_size, ttl)
+        self._inflight: dict[str, asyncio.Task] = {}
+        # A load is not cached if its id was invalidated while it ran. Only ids
+        # with a load running are tracked: id -> running loads / invalidations
+        self._loading: dict[str, int] = {}
+        self._generations: dict[str, int] = {}
+        # Bumped by clear(), which invalidates every id
+        self._epoch = 0
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "inflight": len(self._inflight)}
+
+    def invalidate(self, stream_id: str) -> None:
+        if stream_id in self._loading:
+            self._generations[stream_id] = self._generations.get(stream_id, 0) + 1
+        self._cache.invalidate(stream_id)
+        self._inflight.pop(stream_id, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._cache.clear()
+        self._inflight.clear()
+
+    def _forget(self, stream_id: str, task: asyncio.Task) -> None:
+        if self._inflight.get(stream_id) is task:
+            del self._inflight[stream_id]
+
+    def _generation(self, stream_id: str) -> tuple[int, int]:
+        return self._epoch, self._generations.get(stream_id, 0)
+
+    async def _load(self, stream_id: str) -> Optional[Stream]:
+        self._loading[stream_id] = self._loading.get(stream_id, 0) + 1
+        generation = self._generation(stream_id)
+        try:
+            stream = await self.inner.get_by_id(stream_id)
+            if generation == self._generation(stream_id):
+                if stream is None:
+                    self._cache.set(stream_id, _NOT_FOUND, ttl=self.negative_ttl)
+                else:
+                    self._cache.set(stream_id, stream)
+            return stream
+        finally:
+            self._loading[stream_id] -= 1
+            if not self._loading[stream_id]:
+                del self._loading[stream_id]
+                self._generations.pop(stream_id, None)
+
+    async def get_by_id(self, stream_id: str) -> Optional[Stream]:
+        cached = self._cache.get(stream_id, _MISSING)
+        if cached is not _MISSING:
+            return None if cached is _NOT_FOUND else cached
+        task = self._inflight.get(stream_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(stream_id))
+            self._inflight[stream_id] = task
+            task.add_done_callback(lambda done: self._forget(stream_id, done))
+        # shield: a cancelled viewer must not cancel the load for everyone else
+        return await asyncio.shield(task)
+
+    async def get_version(self, stream_id: str) -> Optional[Stream]:
+        # A cached stream is as fresh as anything get_by_id would return
+        cached = self._cache.get(stream_id, _MISSING)
+        if cached is not _MISSING:
+            return None if cached is _NOT_FOUND else cached
+        return await self.inner.get_version(stream_id)
+
+    async def create(self, stream: Stream) -> Stream:
+        # New ids cannot be cached yet, so there is nothing to invalidate
+        return await self.inner.create(stream)
+
+    async def update(self, stream_id: str, data: dict) -> Optional[Stream]:
+        self.invalidate(stream_id)
+        updated = await self.inner.update(stream_id, data)
+        self.invalidate(stream_id)
+        return updated
+
+    async def delete(self, stream_id: str) -> bool:
+        self.invalidate(stream_id)
+        deleted = await self.inner.delete(stream_id)
+        self.invalidate(stream_id)
+        return deleted
+
+    async def create_many(self, streams: list[Stream], ordered: bool = True) -> list[BatchItemResult]:
+        return await self.inner.create_many(streams, ordered)
+
+    async def bulk_modify(self, ops: list[StreamBatchOp], ordered: bool = False) -> list[BatchItemResult]:
+        for op in ops:
+            self.invalidate(op.stream_id)
+        results = await self.inner.bulk_modify(ops, ordered)
+        for op in ops:
+            self.invalidate(op.stream_id)
+        return results
+
+    def iter_all(self, batch_size: int = 1000) -> AsyncIterator[Stream]:
+        return self.inner.iter_all(batch_size)
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        mode: str = "text",
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+    ) -> StreamPage:
+        return await self.inner.search(query, limit, mode=mode, cursor=cursor, is_live=is_live)
+
+    async def list_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        fields: Optional[list[str]] = None,
+    ) -> StreamPage:
+        return await self.inner.list_page(
+            limit,
+            cursor=cursor,
+            is_live=is_live,
+            created_after=created_after,
+            created_before=created_before,
+            fields=fields,
+        )
+
+    async def report_viewers(self, worker_id: str, reports: list[ViewerReport]) -> None:
+        # Viewer counts are allowed to lag by a TTL, so cached entries stay
+        await self.inner.report_viewers(worker_id, reports)
+
+    async def prune_viewers(self) -> None:
+        await self.inner.prune_viewers()
+
+    async def ensure_indexes(self) -> None:
+        await self.inner.ensure_indexes()
+
+    async def migrate(self) -> None:
+        await self.inner.migrate()
+
+
+class ChangeStreamInvalidator:
+    """Cross-worker invalidation: watches the collection's change stream and
+    drops cache entries for documents changed by any worker. Presence
+    flushes rewrite every watched stream each interval and are ignored, or
+    they would keep the hottest streams out of the cache.
+
+    Requires a replica set (Atlas always is one).
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, cache: CachedStreamRepository):
+        self.collection = collection
+        self.cache = cache
+
+    async def run(self, retry_delay: float = 5.0) -> None:
+        while True:
+            try:
+                async with self.collection.watch(CHANGE_STREAM_PIPELINE) as changes:
+                    async for change in changes:
+                        self.cache.invalidate(str(change["documentKey"]["_id"]))
+            except PyMongoError as exc:
+                # Changes may have been missed while disconnected
+                logger.warning(f"Stream cache change stream failed: {exc}")
+                self.cache.clear()
+                await asyncio.sleep(retry_delay)
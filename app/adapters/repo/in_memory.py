@@ -1,13 +1,315 @@
-from typing import Dict
-from app.domain.user import User, UserRepository
+import secrets
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from dataclasses import fields as dataclass_fields, replace
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional
+
+from app.domain.analytics import StatsBucket, StreamStats, StreamStatsRepository, bucket_start
+from app.domain.stream import (
+    BatchItemResult, Stream, StreamBatchOp, StreamPage, StreamRepository, ViewerReport,
+    VIEWER_REPORT_TTL, encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor, normalize_text, tokenize,
+)
+from app.domain.user import User, UserAlreadyExists, UserRepository, normalize_email
+
+_STREAM_FIELDS = {field.name for field in dataclass_fields(Stream)} - {"id"}
+_TEXT_FIELDS = {"title", "description"}
+# Same weights as the Mongo text index
+_TITLE_WEIGHT = 10
+_DESCRIPTION_WEIGHT = 1
+
 
 class InMemoryUserRepo(UserRepository):
     def __init__(self):
         self._store: Dict[str, User] = {}
 
     async def get_by_email(self, email: str) -> User | None:
-        return self._store.get(email)
+        return self._store.get(normalize_email(email))
 
     async def add(self, user: User) -> None:
-        self._store[user.email] = user
+        key = normalize_email(user.email)
+        if key in self._store:
+            raise UserAlreadyExists(user.email)
+        self._store[key] = user
+
+    async def update_password_hash(self, email: str, password_hash: str) -> None:
+        key = normalize_email(email)
+        user = self._store.get(key)
+        if user is not None:
+            self._store[key] = User(email=user.email, password_hash=password_hash)
+
+
+class InMemoryStreamRepository(StreamRepository):
+    """StreamRepository kept in process memory, for tests and benchmarks.
+
+    Mirrors MongoStreamRepository: newest-first keyset pages over a sorted
+    (created_at, id) index, copies in and out so callers never share state
+    with the store, and the same batch result semantics. Search uses an
+    inverted word index and a sorted normalized-title index; unlike Mongo's
+    text search it does no stemming or stop-word removal.
+    """
+
+    def __init__(self, viewer_ttl: timedelta = VIEWER_REPORT_TTL):
+        self.viewer_ttl = viewer_ttl
+        self._store: Dict[str, Stream] = {}
+        # stream id -> worker id -> (viewer count, reported at)
+        self._viewers: dict[str, dict[str, tuple[int, datetime]]] = {}
+        # Ascending (created_at, id); pages walk it from the end
+        self._index: list[tuple[datetime, str]] = []
+        # word -> {stream id: weighted occurrences}
+        self._words: dict[str, dict[str, int]] = defaultdict(dict)
+        # Ascending (normalized title, id)
+        self._titles: list[tuple[str, str]] = []
+
+    @staticmethod
+    def _new_id() -> str:
+        return secrets.token_hex(12)
+
+    def _insert(self, stream: Stream) -> None:
+        self._store[stream.id] = replace(stream)
+        insort(self._index, (stream.created_at, stream.id))
+        self._index_text(stream)
+
+    def _unindex(self, stream: Stream) -> None:
+        position = bisect_left(self._index, (stream.created_at, stream.id))
+        del self._index[position]
+        self._unindex_text(stream)
+
+    @staticmethod
+    def _word_weights(stream: Stream) -> Counter:
+        weights = Counter()
+        for word in tokenize(stream.title):
+            weights[word] += _TITLE_WEIGHT
+        for word in tokenize(stream.description):
+            weights[word] += _DESCRIPTION_WEIGHT
+        return weights
+
+    def _index_text(self, stream: Stream) -> None:
+        for word, weight in self._word_weights(stream).items():
+            self._words[word][stream.id] = weight
+        insort(self._titles, (normalize_text(stream.title), stream.id))
+
+    def _unindex_text(self, stream: Stream) -> None:
+        for word in self._word_weights(stream):
+            postings = self._words.get(word)
+            if postings is not None:
+                postings.pop(stream.id, None)
+                if not postings:
+                    del self._words[word]
+        position = bisect_left(self._titles, (normalize_text(stream.title), stream.id))
+        del self._titles[position]
+
+    def _newest_first(self, before: Optional[tuple[datetime, str]] = None):
+        end = len(self._index) if before is None else bisect_left(self._index, before)
+        for position in range(end - 1, -1, -1):
+            yield self._index[position]
+
+    async def create(self, stream: Stream) -> Stream:
+        stream.id = self._new_id()
+        self._insert(stream)
+        return stream
+
+    async def create_many(self, streams: list[Stream], ordered: bool = True) -> list[BatchItemResult]:
+        results = []
+        for i, stream in enumerate(streams):
+            await self.create(stream)
+            results.append(BatchItemResult(index=i, ok=True, id=stream.id, stream=stream))
+        return results
+
+    async def get_by_id(self, stream_id: str) -> Optional[Stream]:
+        stream = self._store.get(stream_id)
+        return replace(stream) if stream else None
+
+    async def get_version(self, stream_id: str) -> Optional[Stream]:
+        return await self.get_by_id(stream_id)
+
+    async def iter_all(self, batch_size: int = 1000) -> AsyncIterator[Stream]:
+        for _, stream_id in list(self._newest_first()):
+            stream = self._store.get(stream_id)
+            if stream is not None:
+                yield replace(stream)
+
+    async def list_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        fields: Optional[list[str]] = None,
+    ) -> StreamPage:
+        before = decode_cursor(cursor) if cursor else None
+        if created_before is not None and (before is None or created_before <= before[0]):
+            before = (created_before, "")
+        items = []
+        has_more = False
+        for created_at, stream_id in self._newest_first(before):
+            if created_after is not None and created_at < created_after:
+                break
+            stream = self._store[stream_id]
+            if is_live is not None and stream.is_live != is_live:
+                continue
+            if len(items) == limit:
+                has_more = True
+                break
+            items.append(stream)
+
+        if fields:
+            hidden = {name: None for name in _STREAM_FIELDS - {"created_at", "viewer_count", *fields}}
+            if "viewer_count" not in fields:
+                hidden["viewer_count"] = 0
+            items = [replace(stream, **hidden) for stream in items]
+        else:
+            items = [replace(stream) for stream in items]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if has_more else None
+        return StreamPage(items=items, next_cursor=next_cursor)
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        mode: str = "text",
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+    ) -> StreamPage:
+        after = decode_search_cursor(cursor) if cursor else None
+        if after is not None and isinstance(after[0], str) != (mode == "prefix"):
+            raise ValueError("Invalid cursor")
+        if mode == "prefix":
+            ranked = self._prefix_matches(normalize_text(query), after)
+        else:
+            scores: Counter = Counter()
+            for word in set(tokenize(query)):
+                for stream_id, weight in self._words.get(word, {}).items():
+                    scores[stream_id] += weight
+            # Best score first, ties by descending id like the Mongo sort (ids
+            # here are random, so unlike ObjectIds this is not newest first)
+            ranked = sorted(((score, stream_id) for stream_id, score in scores.items()), reverse=True)
+            if after is not None:
+                ranked = (key for key in ranked if key < after)
+
+        matches = []
+        for rank, stream_id in ranked:
+            stream = self._store[stream_id]
+            if is_live is not None and stream.is_live != is_live:
+                continue
+            matches.append((rank, stream))
+            if len(matches) > limit:
+                break
+        next_cursor = None
+        if len(matches) > limit:
+            rank, last = matches[limit - 1]
+            next_cursor = encode_search_cursor(rank, last.id)
+        return StreamPage(items=[replace(stream) for _, stream in matches[:limit]], next_cursor=next_cursor)
+
+    def _prefix_matches(self, prefix: str, after: Optional[tuple]):
+        position = bisect_right(self._titles, after) if after else bisect_left(self._titles, (prefix, ""))
+        while position < len(self._titles):
+            title, stream_id = self._titles[position]
+            if not title.startswith(prefix):
+                return
+            yield title, stream_id
+            position += 1
+
+    async def update(self, stream_id: str, data: dict) -> Optional[Stream]:
+        stream = self._store.get(stream_id)
+        if stream is None:
+            return None
+        changes = {key: value for key, value in data.items() if key in _STREAM_FIELDS}
+        if "created_at" in changes or _TEXT_FIELDS & changes.keys():
+            self._unindex(stream)
+            self._insert(replace(stream, **changes))
+        else:
+            self._store[stream_id] = replace(stream, **changes)
+        return replace(self._store[stream_id])
+
+    async def bulk_modify(self, ops: list[StreamBatchOp], ordered: bool = False) -> list[BatchItemResult]:
+        results = []
+        failed = False
+        for i, op in enumerate(ops):
+            if failed and ordered:
+                results.append(BatchItemResult(index=i, ok=False, id=op.stream_id, error="Not attempted"))
+                continue
+            stream = None
+            if op.op == "update":
+                stream = await self.update(op.stream_id, op.data or {})
+                ok = stream is not None
+            else:
+                ok = await self.delete(op.stream_id)
+            failed = failed or not ok
+            results.append(BatchItemResult(
+                index=i, ok=ok, id=op.stream_id, error=None if ok else "Stream not found", stream=stream
+            ))
+        return results
+
+    async def delete(self, stream_id: str) -> bool:
+        stream = self._store.pop(stream_id, None)
+        if stream is None:
+            return False
+        self._unindex(stream)
+        self._viewers.pop(stream_id, None)
+        return True
+
+    def _recount_viewers(self, stream_id: str, cutoff: datetime) -> None:
+        entries = self._viewers.get(stream_id, {})
+        for worker_id in [worker_id for worker_id, (_, at) in entries.items() if at < cutoff]:
+            del entries[worker_id]
+        if not entries:
+            self._viewers.pop(stream_id, None)
+        stream = self._store.get(stream_id)
+        if stream is not None:
+            self._store[stream_id] = replace(stream, viewer_count=sum(count for count, _ in entries.values()))
+
+    async def report_viewers(self, worker_id: str, reports: list[ViewerReport]) -> None:
+        # Counts are summed on write rather than on read; prune_viewers,
+        # called after every flush, keeps stale entries from lingering
+        now = datetime.utcnow()
+        for report in reports:
+            if report.stream_id not in self._store:
+                continue
+            entries = self._viewers.setdefault(report.stream_id, {})
+            if report.viewers > 0:
+                entries[worker_id] = (report.viewers, now)
+            else:
+                entries.pop(worker_id, None)
+            self._recount_viewers(report.stream_id, now - self.viewer_ttl)
+
+    async def prune_viewers(self) -> None:
+        cutoff = datetime.utcnow() - self.viewer_ttl
+        for stream_id in list(self._viewers):
+            self._recount_viewers(stream_id, cutoff)
+
+
+class InMemoryStreamStatsRepository(StreamStatsRepository):
+    """Hourly rollups in a dict, snapshotting an InMemoryStreamRepository."""
+
+    def __init__(self, streams: InMemoryStreamRepository):
+        self.streams = streams
+        self._buckets: Dict[datetime, StatsBucket] = {}
+
+    def _bucket(self, start: datetime) -> StatsBucket:
+        bucket = self._buckets.get(start)
+        if bucket is None:
+            bucket = self._buckets[start] = StatsBucket(start=start)
+        return bucket
+
+    async def increment(self, counts: dict[datetime, dict[str, int]]) -> None:
+        for start, deltas in counts.items():
+            bucket = self._bucket(start)
+            for counter, delta in deltas.items():
+                setattr(bucket, counter, getattr(bucket, counter) + delta)
+
+    async def snapshot_live(self, at: datetime) -> None:
+        live = sum(1 for stream in self.streams._store.values() if stream.is_live)
+        bucket = self._bucket(bucket_start(at))
+        bucket.live, bucket.not_live, bucket.snapshot_at = live, len(self.streams._store) - live, at
 
+    async def get_stats(self, since: datetime, until: datetime) -> StreamStats:
+        buckets = [replace(self._buckets[start]) for start in sorted(self._buckets) if since <= start < until]
+        snapshots = [bucket for bucket in self._buckets.values() if bucket.snapshot_at]
+        latest = max(snapshots, key=lambda bucket: bucket.start, default=None)
+        if latest is None:
+            return StreamStats(live=None, not_live=None, snapshot_at=None, buckets=buckets)
+        return StreamStats(
+            live=latest.live, not_live=latest.not_live, snapshot_at=latest.snapshot_at, buckets=buckets
+        )
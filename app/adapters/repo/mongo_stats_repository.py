@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DESCENDING, UpdateOne
+
+from app.domain.analytics import StatsBucket, StreamStats, StreamStatsRepository, bucket_start
+
+
+def _doc_to_bucket(doc) -> StatsBucket:
+    return StatsBucket(
+        start=doc["_id"],
+        created=doc.get("created", 0),
+        updated=doc.get("updated", 0),
+        deleted=doc.get("deleted", 0),
+        live=doc.get("live"),
+        not_live=doc.get("not_live"),
+        snapshot_at=doc.get("snapshot_at"),
+    )
+
+
+class MongoStreamStatsRepository(StreamStatsRepository):
+    """Rollups in ``stream_stats_hourly``, keyed by the bucket start as _id.
+
+    Dashboards read at most one small document per hour of range, and the
+    _id index is all the lookups need.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db["stream_stats_hourly"]
+        self.streams = db["streams"]
+
+    async def increment(self, counts: dict[datetime, dict[str, int]]) -> None:
+        if not counts:
+            return
+        await self.collection.bulk_write([
+            UpdateOne({"_id": start}, {"$inc": deltas}, upsert=True)
+            for start, deltas in counts.items()
+        ], ordered=False)
+
+    async def snapshot_live(self, at: datetime) -> None:
+        # Equality on the is_live index prefix: both are index-only counts
+        live, not_live = await asyncio.gather(
+            self.streams.count_documents({"is_live": True}),
+            self.streams.count_documents({"is_live": False}),
+        )
+        await self.collection.update_one(
+            {"_id": bucket_start(at)},
+            {"$set": {"live": live, "not_live": not_live, "snapshot_at": at}},
+            upsert=True,
+        )
+
+    async def get_stats(self, since: datetime, until: datetime) -> StreamStats:
+        docs = await (
+            self.collection.find({"_id": {"$gte": since, "$lt": until}})
+            .sort("_id", 1)
+            .to_list(length=None)
+        )
+        buckets = [_doc_to_bucket(doc) for doc in docs]
+        latest: Optional[StatsBucket] = next((b for b in reversed(buckets) if b.snapshot_at), None)
+        if latest is None:
+            doc = await self.collection.find_one({"snapshot_at": {"$ne": None}}, sort=[("_id", DESCENDING)])
+            latest = _doc_to_bucket(doc) if doc else None
+        if latest is None:
+            return StreamStats(live=None, not_live=None, snapshot_at=None, buckets=buckets)
+        return StreamStats(
+            live=latest.live, not_live=latest.not_live, snapshot_at=latest.snapshot_at, buckets=buckets
+        )
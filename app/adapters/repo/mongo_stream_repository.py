@@ -1,47 +1,385 @@
-from app.domain.stream import Stream, StreamRepository
+import re
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from app.domain.stream import (
+    BatchItemResult, Stream, StreamBatchOp, StreamPage, StreamRepository, ViewerReport,
+    VIEWER_REPORT_TTL, encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor, normalize_text,
+)
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, TEXT, DeleteOne, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+def _stream_to_doc(stream: Stream) -> dict:
+    doc = stream.__dict__.copy()
+    doc.pop("id", None)
+    # Derived from the per-worker counts in "viewers", never stored
+    doc.pop("viewer_count", None)
+    doc["title_normalized"] = normalize_text(stream.title)
+    return doc
+
+
+def _update_doc(data: dict) -> dict:
+    if "title" not in data:
+        return data
+    return {**data, "title_normalized": normalize_text(data["title"])}
+
+
+def _object_id(value: str) -> ObjectId:
+    try:
+        return ObjectId(value)
+    except InvalidId as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _fresh_viewers(viewers: Optional[dict], cutoff: datetime) -> int:
+    return sum(
+        max(entry.get("count", 0), 0)
+        for entry in (viewers or {}).values()
+        if entry.get("at") is not None and entry["at"] >= cutoff
+    )
 
 
 class MongoStreamRepository(StreamRepository):
-    def __init__(self, db: AsyncIOMotorDatabase):
+    """Streams in the ``streams`` collection.
+
+    Viewer counts live in ``viewers.<worker id>: {count, at}``, one entry
+    owned and overwritten by each worker, plus ``viewers_at``, the time of
+    the latest report. Reads add up the entries younger than ``viewer_ttl``,
+    so a worker that dies without a final flush stops counting on its own.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, viewer_ttl: timedelta = VIEWER_REPORT_TTL):
         self.collection = db["streams"]
+        self.viewer_ttl = viewer_ttl
 
     def _doc_to_stream(self, doc) -> Stream:
+        # .get() so that projected documents (see list_page) convert as well
         return Stream(
             id=str(doc["_id"]),
-            title=doc["title"],
+            title=doc.get("title"),
             description=doc.get("description"),
-            is_live=doc["is_live"],
-            created_at=doc["created_at"],
-            updated_at=doc["updated_at"],
+            is_live=doc.get("is_live"),
+            created_at=doc.get("created_at"),
+            updated_at=doc.get("updated_at"),
+            viewer_count=_fresh_viewers(doc.get("viewers"), datetime.utcnow() - self.viewer_ttl),
         )
 
+    async def ensure_indexes(self) -> None:
+        # Keyset pagination sorts on (created_at, _id); the is_live variant
+        # keeps filtered pages on an index as well.
+        await self.collection.create_indexes([
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+            IndexModel(
+                [("is_live", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="is_live_created_at_id",
+            ),
+            # Search: full-text with title weighted over description, and
+            # prefix matches on the normalized title
+            IndexModel(
+                [("title", TEXT), ("description", TEXT)],
+                name="title_description_text",
+                weights={"title": 10, "description": 1},
+            ),
+            IndexModel([("title_normalized", ASCENDING), ("_id", ASCENDING)], name="title_normalized_id"),
+            # Only documents with viewer counts; prune_viewers looks for stale ones
+            IndexModel([("viewers_at", ASCENDING)], name="viewers_at", sparse=True),
+        ])
+
+    async def migrate(self) -> None:
+        await self._backfill_title_normalized()
+
+    async def _backfill_title_normalized(self, batch_size: int = 1000) -> None:
+        # Documents written before title_normalized existed are indexed as
+        # null, so this lookup stays on the index once they are done.
+        while True:
+            docs = await self.collection.find(
+                {"title_normalized": None}, {"title": 1}
+            ).limit(batch_size).to_list(length=batch_size)
+            if not docs:
+                return
+            await self.collection.bulk_write([
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"title_normalized": normalize_text(doc.get("title"))}})
+                for doc in docs
+            ], ordered=False)
+
     async def create(self, stream: Stream) -> Stream:
-        doc = stream.__dict__.copy()
-        doc.pop("id", None)
+        doc = _stream_to_doc(stream)
         result = await self.collection.insert_one(doc)
         stream.id = str(result.inserted_id)
         return stream
 
+    async def create_many(self, streams: list[Stream], ordered: bool = True) -> list[BatchItemResult]:
+        docs = []
+        for stream in streams:
+            doc = _stream_to_doc(stream)
+            doc["_id"] = ObjectId()
+            stream.id = str(doc["_id"])
+            docs.append(doc)
+        errors: dict[int, str] = {}
+        if docs:
+            try:
+                await self.collection.insert_many(docs, ordered=ordered)
+            except BulkWriteError as exc:
+                errors = _write_errors(exc, len(docs), ordered)
+        return [
+            BatchItemResult(index=i, ok=False, id=stream.id, error=errors[i]) if i in errors
+            else BatchItemResult(index=i, ok=True, id=stream.id, stream=stream)
+            for i, stream in enumerate(streams)
+        ]
+
     async def get_by_id(self, stream_id: str):
+        if not ObjectId.is_valid(stream_id):
+            return None
         doc = await self.collection.find_one({"_id": ObjectId(stream_id)})
         return self._doc_to_stream(doc) if doc else None
 
-    async def list_all(self):
-        streams = []
-        async for doc in self.collection.find().sort("created_at", -1):
-            streams.append(self._doc_to_stream(doc))
-        return streams
+    async def get_version(self, stream_id: str) -> Optional[Stream]:
+        if not ObjectId.is_valid(stream_id):
+            return None
+        doc = await self.collection.find_one(
+            {"_id": ObjectId(stream_id)}, {"created_at": 1, "updated_at": 1, "viewers": 1}
+        )
+        return self._doc_to_stream(doc) if doc else None
+
+    async def iter_all(self, batch_size: int = 1000) -> AsyncIterator[Stream]:
+        cursor = (
+            self.collection.find()
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+            .batch_size(batch_size)
+        )
+        async for doc in cursor:
+            yield self._doc_to_stream(doc)
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        mode: str = "text",
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+    ) -> StreamPage:
+        if mode == "prefix":
+            return await self._search_prefix(query, limit, cursor, is_live)
+        match = {"$text": {"$search": query}}
+        if is_live is not None:
+            match["is_live"] = is_live
+        pipeline = [{"$match": match}, {"$addFields": {"_score": {"$meta": "textScore"}}}]
+        if cursor:
+            cursor_score, cursor_id = decode_search_cursor(cursor)
+            cursor_oid = _object_id(cursor_id)
+            pipeline.append({"$match": {"$or": [
+                {"_score": {"$lt": cursor_score}},
+                {"_score": cursor_score, "_id": {"$lt": cursor_oid}},
+            ]}})
+        pipeline += [{"$sort": {"_score": -1, "_id": -1}}, {"$limit": limit + 1}]
+        docs = await self.collection.aggregate(pipeline).to_list(length=limit + 1)
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_search_cursor(docs[-1]["_score"], str(docs[-1]["_id"]))
+        return StreamPage(items=[self._doc_to_stream(doc) for doc in docs], next_cursor=next_cursor)
+
+    async def _search_prefix(
+        self, query: str, limit: int, cursor: Optional[str], is_live: Optional[bool]
+    ) -> StreamPage:
+        # An anchored, case-sensitive regex is a range scan on the index
+        clauses = [{"title_normalized": {"$regex": "^" + re.escape(normalize_text(query))}}]
+        if is_live is not None:
+            clauses.append({"is_live": is_live})
+        if cursor:
+            cursor_title, cursor_id = decode_search_cursor(cursor)
+            cursor_oid = _object_id(cursor_id)
+            clauses.append({"$or": [
+                {"title_normalized": {"$gt": cursor_title}},
+                {"title_normalized": cursor_title, "_id": {"$gt": cursor_oid}},
+            ]})
+        docs = await (
+            self.collection.find({"$and": clauses})
+            .sort([("title_normalized", ASCENDING), ("_id", ASCENDING)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_search_cursor(docs[-1]["title_normalized"], str(docs[-1]["_id"]))
+        return StreamPage(items=[self._doc_to_stream(doc) for doc in docs], next_cursor=next_cursor)
+
+    async def list_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        fields: Optional[list[str]] = None,
+    ) -> StreamPage:
+        clauses = []
+        if is_live is not None:
+            clauses.append({"is_live": is_live})
+        if created_after is not None:
+            clauses.append({"created_at": {"$gte": created_after}})
+        if created_before is not None:
+            clauses.append({"created_at": {"$lt": created_before}})
+        if cursor:
+            cursor_at, cursor_id = decode_cursor(cursor)
+            cursor_oid = _object_id(cursor_id)
+            clauses.append({"$or": [
+                {"created_at": {"$lt": cursor_at}},
+                {"created_at": cursor_at, "_id": {"$lt": cursor_oid}},
+            ]})
+        query = {"$and": clauses} if clauses else {}
+
+        projection = None
+        if fields:
+            projection = {name: 1 for name in fields if name != "viewer_count"}
+            projection["created_at"] = 1
+            if "viewer_count" in fields:
+                projection["viewers"] = 1
+
+        # Fetch one extra document to know whether another page exists
+        docs = await (
+            self.collection.find(query, projection)
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = encode_cursor(last["created_at"], str(last["_id"]))
+        return StreamPage(items=[self._doc_to_stream(doc) for doc in docs], next_cursor=next_cursor)
 
     async def update(self, stream_id: str, data: dict):
+        if not ObjectId.is_valid(stream_id):
+            return None
         result = await self.collection.find_one_and_update(
             {"_id": ObjectId(stream_id)},
-            {"$set": data},
+            {"$set": _update_doc(data)},
             return_document=True,
         )
         return self._doc_to_stream(result) if result else None
 
+    async def bulk_modify(self, ops: list[StreamBatchOp], ordered: bool = False) -> list[BatchItemResult]:
+        results: list[Optional[BatchItemResult]] = [None] * len(ops)
+        oids: dict[int, ObjectId] = {}
+        for i, op in enumerate(ops):
+            try:
+                oids[i] = ObjectId(op.stream_id)
+            except InvalidId:
+                results[i] = BatchItemResult(index=i, ok=False, id=op.stream_id, error="Invalid id")
+
+        # bulk_write only reports totals, so look up which ids exist first
+        # to be able to report "not found" per item.
+        existing = {
+            doc["_id"]
+            async for doc in self.collection.find({"_id": {"$in": list(oids.values())}}, {"_id": 1})
+        }
+        # Like applying the ops one by one: after a delete, later ops on the
+        # same id find nothing (the in-memory repository behaves the same)
+        deleted_before: set[ObjectId] = set()
+        for i, oid in oids.items():
+            if oid not in existing or oid in deleted_before:
+                results[i] = BatchItemResult(index=i, ok=False, id=ops[i].stream_id, error="Stream not found")
+            elif ops[i].op == "delete":
+                deleted_before.add(oid)
+
+        # Ordered batches stop at the first failing item, like Mongo does
+        first_failure = next((i for i, result in enumerate(results) if result is not None), None)
+        indexes = [
+            i for i in range(len(ops))
+            if results[i] is None and (not ordered or first_failure is None or i < first_failure)
+        ]
+        operations = [
+            UpdateOne({"_id": oids[i]}, {"$set": _update_doc(ops[i].data or {})}) if ops[i].op == "update"
+            else DeleteOne({"_id": oids[i]})
+            for i in indexes
+        ]
+        errors: dict[int, str] = {}
+        if operations:
+            try:
+                await self.collection.bulk_write(operations, ordered=ordered)
+            except BulkWriteError as exc:
+                errors = _write_errors(exc, len(operations), ordered)
+
+        # bulk_write has no per-item results and an id can disappear between
+        # the lookup above and the write, so read the touched ids back: an
+        # updated stream must still exist (and is returned to the caller), a
+        # deleted one must be gone, whoever deleted it.
+        applied = [i for position, i in enumerate(indexes) if position not in errors]
+        remaining = {
+            doc["_id"]: doc
+            async for doc in self.collection.find({"_id": {"$in": [oids[i] for i in applied]}})
+        } if applied else {}
+
+        for position, i in enumerate(indexes):
+            error = errors.get(position)
+            stream = None
+            doc = remaining.get(oids[i])
+            if error is None and ops[i].op == "update":
+                if doc is not None:
+                    stream = self._doc_to_stream(doc)
+                elif oids[i] not in deleted_before:
+                    # Deleted by another request; an update followed by a
+                    # delete in this batch did happen and stays ok
+                    error = "Stream not found"
+            elif error is None and doc is not None:
+                error = "Delete not applied"
+            results[i] = BatchItemResult(index=i, ok=error is None, id=ops[i].stream_id, error=error, stream=stream)
+        return [
+            result or BatchItemResult(index=i, ok=False, id=ops[i].stream_id, error="Not attempted")
+            for i, result in enumerate(results)
+        ]
+
     async def delete(self, stream_id: str):
+        if not ObjectId.is_valid(stream_id):
+            return False
         result = await self.collection.delete_one({"_id": ObjectId(stream_id)})
         return result.deleted_count > 0
+
+    async def report_viewers(self, worker_id: str, reports: list[ViewerReport]) -> None:
+        now = datetime.utcnow()
+        cutoff = now - self.viewer_ttl
+        operations = []
+        for report in reports:
+            # Pipeline update: drop this worker's old entry and any stale
+            # ones, then add the new count, in one atomic write
+            entries = {"$filter": {
+                "input": {"$objectToArray": {"$ifNull": ["$viewers", {}]}},
+                "as": "entry",
+                "cond": {"$and": [{"$ne": ["$$entry.k", worker_id]}, {"$gte": ["$$entry.v.at", cutoff]}]},
+            }}
+            if report.viewers > 0:
+                entries = {"$concatArrays": [entries, [{"k": worker_id, "v": {"count": report.viewers, "at": now}}]]}
+            fields = {
+                "viewers": {"$arrayToObject": entries},
+                "viewers_at": now,
+                "heartbeat_count": {"$add": [{"$ifNull": ["$heartbeat_count", 0]}, report.heartbeats]},
+            }
+            if report.last_heartbeat_at is not None:
+                fields["last_heartbeat_at"] = {"$max": ["$last_heartbeat_at", report.last_heartbeat_at]}
+            operations.append(UpdateOne({"_id": ObjectId(report.stream_id)}, [{"$set": fields}]))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def prune_viewers(self) -> None:
+        # viewers_at is the newest entry, so everything under it is stale too
+        await self.collection.update_many(
+            {"viewers_at": {"$lt": datetime.utcnow() - self.viewer_ttl}},
+            {"$unset": {"viewers": "", "viewers_at": ""}},
+        )
+
+
+def _write_errors(exc: BulkWriteError, count: int, ordered: bool) -> dict[int, str]:
+    """Map a BulkWriteError to {operation index: message}."""
+    errors = {error["index"]: error.get("errmsg", "Write failed") for error in exc.details.get("writeErrors", [])}
+    if ordered and errors:
+        # Mongo stops an ordered batch at the first error
+        for i in range(min(errors) + 1, count):
+            errors.setdefault(i, "Not attempted")
+    return errors
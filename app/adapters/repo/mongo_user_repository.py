@@ -0,0 +1,57 @@
+import os
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from app.domain.user import User, UserAlreadyExists, UserRepository, normalize_email
+from app.infrastructure.cache import TTLCache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db["users"]
+        # Only found users are cached: a cached miss on one worker would hide
+        # a signup made on another worker until the entry expired.
+        self._cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_indexes([
+            IndexModel([("email_normalized", ASCENDING)], name="email_normalized_unique", unique=True),
+        ])
+
+    async def get_by_email(self, email: str) -> User | None:
+        key = normalize_email(email)
+        user = self._cache.get(key)
+        if user is not None:
+            return user
+        doc = await self.collection.find_one(
+            {"email_normalized": key}, {"_id": 0, "email": 1, "password_hash": 1}
+        )
+        if doc is None:
+            return None
+        user = User(email=doc["email"], password_hash=doc["password_hash"])
+        self._cache.set(key, user)
+        return user
+
+    async def add(self, user: User) -> None:
+        key = normalize_email(user.email)
+        self._cache.invalidate(key)
+        try:
+            await self.collection.insert_one({
+                "email": user.email,
+                "email_normalized": key,
+                "password_hash": user.password_hash,
+            })
+        except DuplicateKeyError as exc:
+            raise UserAlreadyExists(user.email) from exc
+
+    async def update_password_hash(self, email: str, password_hash: str) -> None:
+        key = normalize_email(email)
+        self._cache.invalidate(key)
+        await self.collection.update_one(
+            {"email_normalized": key}, {"$set": {"password_hash": password_hash}}
+        )
@@ -1,19 +1,110 @@
-from fastapi import Depends
+from dataclasses import dataclass
+from typing import Optional
 
-from app.adapters.repo.in_memory import InMemoryUserRepo
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from starlette.requests import HTTPConnection
+
+from app.adapters.repo.cached_stream_repository import CachedStreamRepository
+from app.adapters.repo.in_memory import InMemoryStreamRepository, InMemoryStreamStatsRepository, InMemoryUserRepo
+from app.adapters.repo.mongo_stats_repository import MongoStreamStatsRepository
 from app.adapters.repo.mongo_stream_repository import MongoStreamRepository
+from app.adapters.repo.mongo_user_repository import MongoUserRepository
+from app.domain.analytics import StreamStatsRepository
+from app.domain.stream import StreamRepository
+from app.domain.user import UserRepository
 from app.infrastructure.db import get_database
+from app.infrastructure.events import InMemoryEventBroker
+from app.infrastructure.health import HealthMonitor
+from app.usecase.analytics_service import AnalyticsService
 from app.usecase.auth_service import AuthService
+from app.usecase.presence_service import PresenceService
 from app.usecase.stream_service import StreamService
 
-def get_user_repo() -> InMemoryUserRepo:
-    return InMemoryUserRepo()
 
-def get_stream_service() -> StreamService:
-    db = get_database()
-    repo = MongoStreamRepository(db)
-    return StreamService(repo)
+@dataclass
+class Container:
+    """Everything that lives for the whole application lifetime.
+
+    Built once by the lifespan in app.main; the dependencies below only look
+    the pre-built objects up, so nothing is constructed per request.
+    """
+    client: Optional[AsyncIOMotorClient]
+    db: Optional[AsyncIOMotorDatabase]
+    stream_repo: CachedStreamRepository
+    user_repo: UserRepository
+    event_broker: InMemoryEventBroker
+    presence: PresenceService
+    analytics: AnalyticsService
+    stream_service: StreamService
+    auth_service: AuthService
+    health: Optional[HealthMonitor] = None
+
+
+def _assemble(
+    client: Optional[AsyncIOMotorClient],
+    db: Optional[AsyncIOMotorDatabase],
+    streams: StreamRepository,
+    user_repo: UserRepository,
+    stats_repo: StreamStatsRepository,
+    health: Optional[HealthMonitor] = None,
+) -> Container:
+    stream_repo = CachedStreamRepository(streams)
+    event_broker = InMemoryEventBroker()
+    analytics = AnalyticsService(stats_repo)
+    presence = PresenceService(stream_repo)
+    return Container(
+        client=client,
+        db=db,
+        stream_repo=stream_repo,
+        user_repo=user_repo,
+        event_broker=event_broker,
+        presence=presence,
+        analytics=analytics,
+        stream_service=StreamService(stream_repo, events=event_broker, analytics=analytics, presence=presence),
+        auth_service=AuthService(user_repo),
+        health=health,
+    )
+
+
+def build_container(client: AsyncIOMotorClient, health: Optional[HealthMonitor] = None) -> Container:
+    db = get_database(client)
+    return _assemble(
+        client, db, MongoStreamRepository(db), MongoUserRepository(db), MongoStreamStatsRepository(db), health
+    )
+
+
+def build_in_memory_container() -> Container:
+    """Same wiring without MongoDB, for tests and offline benchmarks"""
+    streams = InMemoryStreamRepository()
+    return _assemble(None, None, streams, InMemoryUserRepo(), InMemoryStreamStatsRepository(streams))
+
+
+# async so FastAPI calls them inline instead of through the threadpool.
+# HTTPConnection so they also resolve for WebSocket routes.
+
+async def get_client(conn: HTTPConnection) -> AsyncIOMotorClient:
+    return conn.app.state.container.client
+
+async def get_health_monitor(conn: HTTPConnection) -> Optional[HealthMonitor]:
+    return conn.app.state.container.health
+
+async def get_user_repo(conn: HTTPConnection) -> UserRepository:
+    return conn.app.state.container.user_repo
+
+async def get_stream_repo(conn: HTTPConnection) -> CachedStreamRepository:
+    return conn.app.state.container.stream_repo
+
+async def get_event_broker(conn: HTTPConnection) -> InMemoryEventBroker:
+    return conn.app.state.container.event_broker
+
+async def get_presence_service(conn: HTTPConnection) -> PresenceService:
+    return conn.app.state.container.presence
+
+async def get_analytics_service(conn: HTTPConnection) -> AnalyticsService:
+    return conn.app.state.container.analytics
+
+async def get_stream_service(conn: HTTPConnection) -> StreamService:
+    return conn.app.state.container.stream_service
 
-def get_auth_service(user_repo=Depends(get_user_repo)) -> AuthService:
-    user_repo = get_user_repo()
-    return AuthService(user_repo)
+async def get_auth_service(conn: HTTPConnection) -> AuthService:
+    return conn.app.state.container.auth_service
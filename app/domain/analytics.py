@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+BUCKET_SIZE = timedelta(hours=1)
+STATS_COUNTERS = ("created", "updated", "deleted")
+
+
+def bucket_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+@dataclass
+class StatsBucket:
+    start: datetime
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    # Last live/not-live snapshot taken during the hour, if any
+    live: Optional[int] = None
+    not_live: Optional[int] = None
+    snapshot_at: Optional[datetime] = None
+
+
+@dataclass
+class StreamStats:
+    live: Optional[int]
+    not_live: Optional[int]
+    snapshot_at: Optional[datetime]
+    buckets: list[StatsBucket]
+
+
+class StreamStatsRepository:
+    """Hourly rollup documents, one per bucket start."""
+
+    async def increment(self, counts: dict[datetime, dict[str, int]]) -> None:
+        """Add counter deltas to the buckets starting at the given hours."""
+        raise NotImplementedError
+
+    async def snapshot_live(self, at: datetime) -> None:
+        """Store the current live and not-live stream counts on the bucket of ``at``."""
+        raise NotImplementedError
+
+    async def get_stats(self, since: datetime, until: datetime) -> StreamStats:
+        """Buckets in [since, until) that exist, oldest first, and the latest snapshot."""
+        raise NotImplementedError
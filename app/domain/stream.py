@@ -1,6 +1,10 @@
+import base64
+import json
+import re
+import unicodedata
 from dataclasses import dataclass
-from typing import Optional
-from datetime import datetime
+from typing import AsyncIterator, Optional
+from datetime import datetime, timedelta
 
 
 @dataclass
@@ -11,6 +15,106 @@ class Stream:
     is_live: bool
     created_at: datetime
     updated_at: datetime
+    viewer_count: int = 0
+
+
+@dataclass
+class ViewerReport:
+    stream_id: str
+    viewers: int  # concurrent viewers on the reporting worker right now
+    heartbeats: int  # heartbeats since the previous report
+    last_heartbeat_at: Optional[datetime]
+
+
+# A worker's viewer count stops counting once it has not been refreshed for
+# this long, e.g. because the worker died without a final flush
+VIEWER_REPORT_TTL = timedelta(seconds=30)
+
+
+@dataclass
+class StreamBatchOp:
+    op: str  # "update" | "delete"
+    stream_id: str
+    data: Optional[dict] = None
+
+
+@dataclass
+class BatchItemResult:
+    index: int
+    ok: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+    stream: Optional[Stream] = None
+
+
+@dataclass
+class StreamEvent:
+    type: str  # "created" | "updated" | "deleted"
+    stream_id: str
+    stream: Optional[Stream] = None
+
+
+@dataclass
+class StreamPage:
+    items: list[Stream]
+    next_cursor: Optional[str]
+
+
+# Fields a client may ask for via projection; id and created_at are always returned.
+PROJECTABLE_FIELDS = ("title", "description", "is_live", "created_at", "updated_at", "viewer_count")
+
+
+SEARCH_MODES = ("text", "prefix")
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return _WORD.findall(normalize_text(text))
+
+
+def _encode_key(key: list) -> str:
+    raw = json.dumps(key, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_key(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded))
+    if not isinstance(key, list) or len(key) != 2:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def encode_cursor(created_at: datetime, stream_id: str) -> str:
+    return _encode_key([created_at.isoformat(), stream_id])
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, stream_id = _decode_key(cursor)
+        return datetime.fromisoformat(created_at), str(stream_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def encode_search_cursor(rank: float | str, stream_id: str) -> str:
+    """Cursor for search pages; rank is the text score or the normalized title"""
+    return _encode_key([rank, stream_id])
+
+
+def decode_search_cursor(cursor: str) -> tuple[float | str, str]:
+    try:
+        rank, stream_id = _decode_key(cursor)
+        if not isinstance(rank, (int, float, str)) or isinstance(rank, bool):
+            raise ValueError("Invalid cursor")
+        return rank, str(stream_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
 
 
 class StreamRepository:
@@ -20,11 +124,67 @@ class StreamRepository:
     async def get_by_id(self, stream_id: str) -> Optional[Stream]:
         raise NotImplementedError
 
-    async def list_all(self) -> list[Stream]:
+    async def get_version(self, stream_id: str) -> Optional[Stream]:
+        """Just enough of a stream to validate a cached copy: id, created_at,
+        updated_at and viewer_count. Other fields may be left as None."""
+        raise NotImplementedError
+
+    async def list_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        fields: Optional[list[str]] = None,
+    ) -> StreamPage:
+        raise NotImplementedError
+
+    def iter_all(self, batch_size: int = 1000) -> AsyncIterator[Stream]:
+        raise NotImplementedError
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        mode: str = "text",
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+    ) -> StreamPage:
+        """Text mode: any query word in title/description, best matches first.
+        Prefix mode: titles starting with the query, alphabetically."""
+        raise NotImplementedError
+
+    async def create_many(self, streams: list[Stream], ordered: bool = True) -> list[BatchItemResult]:
         raise NotImplementedError
 
     async def update(self, stream_id: str, data: dict) -> Optional[Stream]:
         raise NotImplementedError
 
+    async def bulk_modify(self, ops: list[StreamBatchOp], ordered: bool = False) -> list[BatchItemResult]:
+        raise NotImplementedError
+
     async def delete(self, stream_id: str) -> bool:
         raise NotImplementedError
+
+    async def report_viewers(self, worker_id: str, reports: list[ViewerReport]) -> None:
+        """Replace ``worker_id``'s viewer count on each stream. A stream's
+        viewer_count is the sum of the counts reported within VIEWER_REPORT_TTL."""
+        raise NotImplementedError
+
+    async def prune_viewers(self) -> None:
+        """Drop viewer counts that have outlived VIEWER_REPORT_TTL."""
+        raise NotImplementedError
+
+    async def ensure_indexes(self) -> None:
+        pass
+
+    async def migrate(self) -> None:
+        """Bring documents written by older versions up to date. Idempotent,
+        and safe to run from several workers at once."""
+        pass
+
+
+class StreamEventPublisher:
+    def publish(self, event: StreamEvent) -> None:
+        raise NotImplementedError
@@ -9,6 +9,15 @@ class User(BaseModel):
     password_hash: str
 
 
+class UserAlreadyExists(Exception):
+    pass
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
 class UserRepository(Protocol):
     async def get_by_email(self, email: str) -> User | None: ...
     async def add(self, user: User) -> None: ...
+    async def update_password_hash(self, email: str, password_hash: str) -> None: ...
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Optional
+
+from app.infrastructure.db import env_int
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionLane:
+    """Concurrency limit with a bounded FIFO wait queue.
+
+    A request that cannot start right away waits at most ``max_wait``
+    seconds. If the expected wait (queue position times the recent average
+    service time, spread over ``limit`` slots) is already longer than that,
+    it is rejected immediately instead of timing out after holding a place.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.rejected = 0
+        self.avg_service_time = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_service_time * (self.waiting + 1) / self.limit))
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        expected_wait = (self.waiting + 1) * self.avg_service_time / self.limit
+        if self.waiting >= self.max_queue or expected_wait > self.max_wait:
+            self.rejected += 1
+            raise Overloaded(self.name)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted a slot just as the deadline passed; use it
+                return
+            waiter.cancel()
+            self.rejected += 1
+            raise Overloaded(self.name)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        if service_time is not None:
+            # EWMA keeps the wait estimate current without storing samples
+            self.avg_service_time += 0.1 * (service_time - self.avg_service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot over directly; active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def default_lanes() -> dict[str, AdmissionLane]:
+    # streams stays below MONGO_MAX_POOL_SIZE so requests do not pile up on
+    # the pool; health and auth get lanes of their own so that they are never
+    # queued behind stream reads. An export holds its slot until the last
+    # row is sent, so exports only compete with each other.
+    max_wait = env_int("ADMISSION_MAX_WAIT_MS", 2000) / 1000
+    return {
+        "health": AdmissionLane(
+            "health", env_int("ADMISSION_HEALTH_CONCURRENCY", 8), env_int("ADMISSION_HEALTH_QUEUE", 16), max_wait
+        ),
+        "auth": AdmissionLane(
+            "auth", env_int("ADMISSION_AUTH_CONCURRENCY", 16), env_int("ADMISSION_AUTH_QUEUE", 64), max_wait
+        ),
+        "streams": AdmissionLane(
+            "streams", env_int("ADMISSION_STREAMS_CONCURRENCY", 40), env_int("ADMISSION_STREAMS_QUEUE", 100), max_wait
+        ),
+        "export": AdmissionLane(
+            "export", env_int("ADMISSION_EXPORT_CONCURRENCY", 2), env_int("ADMISSION_EXPORT_QUEUE", 4), max_wait
+        ),
+    }
+
+
+def lane_for_path(path: str) -> Optional[str]:
+    if path.startswith("/health") or path == "/metrics":
+        return "health"
+    if path.startswith("/auth"):
+        return "auth"
+    if path == "/streams/events":
+        # Long-lived SSE connection; limiting it would pin a slot forever
+        return None
+    if path == "/streams/export":
+        return "export"
+    return "streams"
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware rejecting excess load with 503 + Retry-After."""
+
+    def __init__(self, app, lanes: Optional[dict[str, AdmissionLane]] = None):
+        self.app = app
+        self.lanes = lanes if lanes is not None else default_lanes()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = lane_for_path(scope["path"])
+        lane = self.lanes.get(name) if name else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await lane.acquire()
+        except Overloaded:
+            await self._reject(send, lane)
+            return
+        start = time.perf_counter()
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.body" and message.get("more_body", False):
+                streaming = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # A streamed body lasts as long as the client reads it, which says
+            # nothing about how fast queued requests will be served
+            lane.release(None if streaming else time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, lane: AdmissionLane) -> None:
+        body = json.dumps({"detail": "Server overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(lane.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,6 +1,5 @@
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from functools import lru_cache
 import os
 import logging
 
@@ -11,8 +10,33 @@ load_dotenv(override=False)
 logger = logging.getLogger(__name__)
 
 
-@lru_cache()
-def get_client() -> AsyncIOMotorClient:
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def get_db_name() -> str:
+    return os.getenv("DB_NAME", "assignmentdb")
+
+
+def mongo_client_options() -> dict:
+    """Pool, timeout and read preference settings, overridable via MONGO_* env vars"""
+    return {
+        "serverSelectionTimeoutMS": env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000),
+        "connectTimeoutMS": env_int("MONGO_CONNECT_TIMEOUT_MS", 30000),
+        "socketTimeoutMS": env_int("MONGO_SOCKET_TIMEOUT_MS", 30000),
+        "waitQueueTimeoutMS": env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000),
+        "maxIdleTimeMS": env_int("MONGO_MAX_IDLE_TIME_MS", 300000),
+        "maxConnecting": env_int("MONGO_MAX_CONNECTING", 2),
+        "maxPoolSize": env_int("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": env_int("MONGO_MIN_POOL_SIZE", 10),
+        "readPreference": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+        "retryWrites": True,  # Enable retryable writes
+        "retryReads": True,  # Enable retryable reads
+    }
+
+
+def create_client(event_listeners: list | None = None) -> AsyncIOMotorClient:
+    """Create the process-wide client; the app lifespan owns and closes it"""
     # Check for MONGO_URI first (preferred), then fall back to MONGO_URL
     mongo_uri = os.getenv("MONGO_URI") or os.getenv("MONGO_URL")
     
@@ -48,15 +72,7 @@ def get_client() -> AsyncIOMotorClient:
     # Connection options for production deployments
     # For mongodb+srv:// connections, TLS is automatically enabled by MongoDB Atlas
     # We don't need to explicitly set tls=True for +srv connections
-    connection_options = {
-        "serverSelectionTimeoutMS": 30000,  # 30 seconds (increased for SSL handshake)
-        "connectTimeoutMS": 30000,  # 30 seconds (increased for SSL handshake)
-        "socketTimeoutMS": 30000,  # 30 seconds socket timeout
-        "retryWrites": True,  # Enable retryable writes
-        "retryReads": True,  # Enable retryable reads
-        "maxPoolSize": 50,  # Maximum number of connections in the pool
-        "minPoolSize": 10,  # Minimum number of connections in the pool
-    }
+    connection_options = mongo_client_options()
     
     # For mongodb+srv://, TLS is automatically enabled - don't set it explicitly
     # Only set TLS options if NOT using +srv protocol
@@ -65,11 +81,12 @@ def get_client() -> AsyncIOMotorClient:
         connection_options["tlsAllowInvalidCertificates"] = False
         connection_options["tlsAllowInvalidHostnames"] = False
     
+    if event_listeners:
+        connection_options["event_listeners"] = event_listeners
+
     return AsyncIOMotorClient(mongo_uri, **connection_options)
 
 
-def get_database() -> AsyncIOMotorDatabase:
-    client = get_client()
-    db_name = os.getenv("DB_NAME", "assignmentdb")
-    return client[db_name]
+def get_database(client: AsyncIOMotorClient) -> AsyncIOMotorDatabase:
+    return client[get_db_name()]
 
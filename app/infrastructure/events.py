@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Iterable, Optional
+
+from app.domain.stream import StreamEvent, StreamEventPublisher
+from app.infrastructure.serialization import json_default
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+
+
+class SubscriptionClosed(Exception):
+    pass
+
+
+def event_to_json(event: StreamEvent) -> str:
+    return json.dumps(asdict(event), default=json_default, separators=(",", ":"))
+
+
+class Subscription:
+    """Per-subscriber queue of pending events, keyed by stream id.
+
+    A newer event for a stream replaces an undelivered older one, so a burst
+    of updates to one stream costs a single delivery. A subscriber with more
+    than ``max_pending`` undelivered streams is too slow and gets dropped.
+    """
+
+    def __init__(self, broker: "InMemoryEventBroker", max_pending: int, stream_ids: Optional[set[str]]):
+        self._broker = broker
+        self._max_pending = max_pending
+        self._stream_ids = stream_ids
+        self._pending: "OrderedDict[str, StreamEvent]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.dropped = False
+
+    def offer(self, event: StreamEvent) -> None:
+        if self.closed or (self._stream_ids is not None and event.stream_id not in self._stream_ids):
+            return
+        self._pending[event.stream_id] = event
+        if len(self._pending) > self._max_pending:
+            self.dropped = True
+            self.close()
+            return
+        self._ready.set()
+
+    async def get(self) -> StreamEvent:
+        while not self._pending:
+            if self.closed:
+                raise SubscriptionClosed()
+            self._ready.clear()
+            await self._ready.wait()
+        if self.dropped:
+            raise SubscriptionClosed()
+        _, event = self._pending.popitem(last=False)
+        return event
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self.dropped:
+            self._pending.clear()
+        self._broker._subscriptions.discard(self)
+        self._ready.set()
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class InMemoryEventBroker(StreamEventPublisher):
+    """Process-wide fan-out of stream events to subscribers."""
+
+    def __init__(self, max_pending: int = EVENT_QUEUE_SIZE):
+        self.max_pending = max_pending
+        self._subscriptions: set[Subscription] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, stream_ids: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(self, self.max_pending, set(stream_ids) if stream_ids else None)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def publish(self, event: StreamEvent) -> None:
+        for subscription in list(self._subscriptions):
+            subscription.offer(event)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PING_INTERVAL_SECONDS = float(os.getenv("HEALTH_PING_INTERVAL_SECONDS", "10"))
+HEALTH_PING_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PING_TIMEOUT_SECONDS", "2"))
+
+
+def _age(moment: Optional[float]) -> Optional[float]:
+    return None if moment is None else round(time.monotonic() - moment, 3)
+
+
+class HealthMonitor:
+    """MongoDB health kept up to date in the background.
+
+    A ping runs on its own schedule with a short timeout, and pymongo's
+    topology/heartbeat/pool events update the state in between. Probes only
+    read this state, so they answer immediately and add no load on Mongo.
+    Listener callbacks run on pymongo's monitor threads and only assign
+    attributes.
+    """
+
+    def __init__(
+        self,
+        interval: float = HEALTH_PING_INTERVAL_SECONDS,
+        timeout: float = HEALTH_PING_TIMEOUT_SECONDS,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.started_at = time.monotonic()
+        self.last_tick_at: Optional[float] = None
+        self.last_ping_at: Optional[float] = None
+        self.last_ping_ok = False
+        self.last_ping_ms: Optional[float] = None
+        self.last_ping_error: Optional[str] = None
+        self.topology_type: Optional[str] = None
+        self.writable: Optional[bool] = None
+        self.last_heartbeat_ok_at: Optional[float] = None
+        self.last_heartbeat_error: Optional[str] = None
+        self.pool_cleared_at: Optional[float] = None
+
+    def listeners(self) -> list:
+        return [_TopologyListener(self), _HeartbeatListener(self), _PoolListener(self)]
+
+    async def ping(self, db: AsyncIOMotorDatabase) -> None:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(db.command("ping"), self.timeout)
+        except Exception as exc:
+            self.last_ping_ok = False
+            self.last_ping_error = f"{type(exc).__name__}: {exc}"
+        else:
+            self.last_ping_ok = True
+            self.last_ping_error = None
+            self.last_ping_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.last_ping_at = time.monotonic()
+
+    async def run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            self.last_tick_at = time.monotonic()
+            await self.ping(db)
+            if not self.last_ping_ok:
+                logger.warning(f"MongoDB health ping failed: {self.last_ping_error}")
+            await asyncio.sleep(self.interval)
+
+    def is_live(self) -> bool:
+        # The monitor loop not ticking for a few intervals means the event
+        # loop is wedged; restarting the process is the only fix for that.
+        if self.last_tick_at is None:
+            return True
+        return time.monotonic() - self.last_tick_at < 3 * self.interval + self.timeout
+
+    def is_ready(self) -> bool:
+        if not self.last_ping_ok or self.last_ping_at is None:
+            return False
+        if time.monotonic() - self.last_ping_at > 3 * self.interval:
+            return False
+        return self.writable is not False
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_seconds": _age(self.started_at),
+            "ping_ok": self.last_ping_ok,
+            "ping_age_seconds": _age(self.last_ping_at),
+            "ping_ms": self.last_ping_ms,
+            "ping_error": self.last_ping_error,
+            "topology_type": self.topology_type,
+            "writable": self.writable,
+            "heartbeat_ok_age_seconds": _age(self.last_heartbeat_ok_at),
+            "heartbeat_error": self.last_heartbeat_error,
+            "pool_cleared_age_seconds": _age(self.pool_cleared_at),
+        }
+
+
+class _TopologyListener(monitoring.TopologyListener):
+    def __init__(self, monitor: HealthMonitor):
+        self.monitor = monitor
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        description = event.new_description
+        self.monitor.topology_type = description.topology_type_name
+        self.monitor.writable = description.has_writable_server()
+
+    def closed(self, event):
+        self.monitor.writable = False
+
+
+class _HeartbeatListener(monitoring.ServerHeartbeatListener):
+    def __init__(self, monitor: HealthMonitor):
+        self.monitor = monitor
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.monitor.last_heartbeat_ok_at = time.monotonic()
+        self.monitor.last_heartbeat_error = None
+
+    def failed(self, event):
+        self.monitor.last_heartbeat_error = f"{event.connection_id}: {event.reply}"
+
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self, monitor: HealthMonitor):
+        self.monitor = monitor
+
+    def pool_cleared(self, event):
+        # Pools are cleared after network errors or a failed heartbeat
+        self.monitor.pool_cleared_at = time.monotonic()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
@@ -0,0 +1,302 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+QUANTILE_WINDOW_SECONDS = float(os.getenv("METRICS_QUANTILE_WINDOW_SECONDS", "60"))
+QUANTILE_WINDOW_SLOTS = 6
+
+
+class Histogram:
+    """Fixed-bucket latency histogram.
+
+    The exported buckets are cumulative over the process lifetime, as
+    Prometheus expects; use histogram_quantile() over them for any range.
+    quantile() only covers the last ``window`` seconds, kept as a ring of
+    ``slots`` bucket arrays that are reset as they come round again, so the
+    p50/p95/p99 gauges follow a slowdown within about a minute.
+
+    observe() may be called from Motor's worker threads, hence the lock.
+    """
+
+    def __init__(
+        self,
+        buckets: tuple = DEFAULT_BUCKETS,
+        window: float = QUANTILE_WINDOW_SECONDS,
+        slots: int = QUANTILE_WINDOW_SLOTS,
+    ):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._slot_seconds = window / slots
+        self._recent = [[0] * (len(buckets) + 1) for _ in range(slots)]
+        # Which slot_seconds period each ring entry currently counts
+        self._recent_period = [-1] * slots
+        self._lock = threading.Lock()
+
+    def _period(self) -> int:
+        return int(time.monotonic() / self._slot_seconds)
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        period = self._period()
+        slot = period % len(self._recent)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if self._recent_period[slot] != period:
+                self._recent_period[slot] = period
+                self._recent[slot] = [0] * len(self.counts)
+            self._recent[slot][index] += 1
+
+    def recent_counts(self) -> list[int]:
+        oldest = self._period() - len(self._recent) + 1
+        totals = [0] * len(self.counts)
+        with self._lock:
+            for period, counts in zip(self._recent_period, self._recent):
+                if period >= oldest:
+                    for index, count in enumerate(counts):
+                        totals[index] += count
+        return totals
+
+    def quantile(self, q: float) -> float:
+        counts = self.recent_counts()
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _render_histogram(name: str, labels: dict, histogram: Histogram) -> Iterable[str]:
+    base = _labels(**labels)
+    sep = "," if base else ""
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}'
+    yield f'{name}_bucket{{{base}{sep}le="+Inf"}} {histogram.count}'
+    yield f"{name}_sum{{{base}}} {histogram.sum}"
+    yield f"{name}_count{{{base}}} {histogram.count}"
+
+
+def _render_quantiles(name: str, labels: dict, histogram: Histogram) -> Iterable[str]:
+    base = _labels(**labels)
+    sep = "," if base else ""
+    for q in QUANTILES:
+        yield f'{name}{{{base}{sep}quantile="{q}"}} {histogram.quantile(q)}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.http: dict[tuple[str, str, str], Histogram] = {}
+        self.in_flight = 0
+        self.mongo_commands: dict[tuple[str, str], Histogram] = {}
+        self.mongo_failures: dict[tuple[str, str], int] = {}
+        self.pool_wait = Histogram()
+        self.pool_checked_out = 0
+        self.pool_checkout_failures = 0
+        # name -> stats() of an in-process cache, read at scrape time
+        self.caches: dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, table: dict, key: tuple) -> Histogram:
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram())
+        return histogram
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        self._histogram(self.http, (method, route, f"{status // 100}xx")).observe(seconds)
+
+    def observe_mongo(self, collection: str, command: str, seconds: float, failed: bool = False) -> None:
+        key = (collection, command)
+        self._histogram(self.mongo_commands, key).observe(seconds)
+        if failed:
+            with self._lock:
+                self.mongo_failures[key] = self.mongo_failures.get(key, 0) + 1
+
+    def pool_checkout(self, wait_seconds) -> None:
+        with self._lock:
+            self.pool_checked_out += 1
+        if wait_seconds is not None:
+            self.pool_wait.observe(wait_seconds)
+
+    def pool_checkin(self) -> None:
+        with self._lock:
+            self.pool_checked_out -= 1
+
+    def pool_checkout_failed(self) -> None:
+        with self._lock:
+            self.pool_checkout_failures += 1
+
+    def register_cache(self, name: str, stats: Callable[[], dict]) -> None:
+        self.caches[name] = stats
+
+    def render(self) -> str:
+        lines = ["# TYPE http_request_duration_seconds histogram"]
+        for (method, route, status), histogram in list(self.http.items()):
+            lines.extend(_render_histogram(
+                "http_request_duration_seconds", {"method": method, "route": route, "status": status}, histogram
+            ))
+        # Over the last QUANTILE_WINDOW_SECONDS only, see Histogram
+        lines.append("# TYPE http_request_duration_quantile_seconds gauge")
+        for (method, route, status), histogram in list(self.http.items()):
+            lines.extend(_render_quantiles(
+                "http_request_duration_quantile_seconds", {"method": method, "route": route, "status": status}, histogram
+            ))
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+
+        lines.append("# TYPE mongo_command_duration_seconds histogram")
+        for (collection, command), histogram in list(self.mongo_commands.items()):
+            lines.extend(_render_histogram(
+                "mongo_command_duration_seconds", {"collection": collection, "command": command}, histogram
+            ))
+        lines.append("# TYPE mongo_command_duration_quantile_seconds gauge")
+        for (collection, command), histogram in list(self.mongo_commands.items()):
+            lines.extend(_render_quantiles(
+                "mongo_command_duration_quantile_seconds", {"collection": collection, "command": command}, histogram
+            ))
+        lines.append("# TYPE mongo_command_failures_total counter")
+        for (collection, command), count in list(self.mongo_failures.items()):
+            lines.append(f"mongo_command_failures_total{{{_labels(collection=collection, command=command)}}} {count}")
+
+        lines.append("# TYPE mongo_pool_wait_seconds histogram")
+        lines.extend(_render_histogram("mongo_pool_wait_seconds", {}, self.pool_wait))
+        lines.append("# TYPE mongo_pool_checked_out gauge")
+        lines.append(f"mongo_pool_checked_out {self.pool_checked_out}")
+        lines.append("# TYPE mongo_pool_checkout_failures_total counter")
+        lines.append(f"mongo_pool_checkout_failures_total {self.pool_checkout_failures}")
+
+        cache_stats = {name: stats() for name, stats in list(self.caches.items())}
+        for metric, kind, key in (
+            ("cache_entries", "gauge", "size"),
+            ("cache_hits_total", "counter", "hits"),
+            ("cache_misses_total", "counter", "misses"),
+            ("cache_inflight_loads", "gauge", "inflight"),
+        ):
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in cache_stats.items():
+                if key in stats:
+                    lines.append(f"{metric}{{{_labels(cache=name)}}} {stats[key]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request per route template."""
+
+    def __init__(self, app, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    @staticmethod
+    def _route_name(scope) -> str:
+        # The router stores the matched route in the shared scope, so labels
+        # stay bounded by the route table without matching a second time
+        route = scope.get("route")
+        return getattr(route, "path", "unknown") if route is not None else "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.in_flight -= 1
+            self.registry.observe_request(
+                scope["method"], self._route_name(scope), status_code, time.perf_counter() - start
+            )
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+        # (connection, request id) -> collection; only started events carry the command
+        self._pending: dict[tuple, str] = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else "-"
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        self.registry.observe_mongo(collection, event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        self.registry.observe_mongo(collection, event.command_name, event.duration_micros / 1e6, failed=True)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+
+    def connection_checked_out(self, event):
+        # duration (time spent waiting for the pool) exists on pymongo >= 4.7
+        self.registry.pool_checkout(getattr(event, "duration", None))
+
+    def connection_checked_in(self, event):
+        self.registry.pool_checkin()
+
+    def connection_check_out_failed(self, event):
+        self.registry.pool_checkout_failed()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
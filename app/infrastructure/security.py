@@ -1,22 +1,81 @@
 # app/infrastructure/security.py
+import asyncio
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, UTC
 from typing import Annotated
 
 import jwt  # ← PyJWT
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+from app.infrastructure.cache import TTLCache
 
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecretkey")
 JWT_ALG = os.getenv("JWT_ALG", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# Hashing runs in a dedicated pool so that pbkdf2 never blocks the event loop.
+# hashlib releases the GIL while deriving keys, so threads scale with cores.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+
+# min == max == default rounds: any stored hash with other rounds needs an update
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_HASH_ROUNDS,
+)
+
+
+class HasherBusyError(Exception):
+    """Raised when the hashing pool already has a full queue."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, queue_size: int):
+        self._workers = workers
+        self._limit = workers + queue_size
+        self._pending = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, fn, *args):
+        if self._pending >= self._limit:
+            raise HasherBusyError("Password hashing pool is saturated")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="password-hash"
+            )
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain: str, hashed: str) -> tuple[bool, str | None]:
+        """Verify a password; the second item is a new hash if the stored one is outdated."""
+        return await self._run(pwd_context.verify_and_update, plain, hashed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
@@ -25,4 +84,21 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALG)  # ← correct
 
 def decode_token(token: str) -> dict:
-    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
\ No newline at end of file
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+
+# Verified claims keyed by the token's digest; each entry lives until the
+# token's own "exp", so a cache hit never outlives the signature check.
+token_cache = TTLCache(TOKEN_CACHE_SIZE, ttl=0)
+
+def decode_token_cached(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+    payload = decode_token(token)
+    exp = payload.get("exp")
+    if exp is not None:
+        remaining = exp - time.time()
+        if remaining > 0:
+            token_cache.set(key, payload, ttl=remaining)
+    return payload
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.domain.stream import Stream, StreamPage
+
+# Built once at import: pydantic compiles the serializer up front, so dumping
+# is a single pass in pydantic-core without the per-item validation FastAPI
+# does for a response_model. Routes keep response_model for the OpenAPI schema.
+_stream_adapter = TypeAdapter(Stream)
+_page_adapter = TypeAdapter(StreamPage)
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def stream_json(stream: Stream) -> bytes:
+    return _stream_adapter.dump_json(stream)
+
+
+def stream_page_json(page: StreamPage, fields: Optional[Iterable[str]] = None) -> bytes:
+    include = None
+    if fields is not None:
+        include = {"items": {"__all__": {"id", "created_at", *fields}}, "next_cursor": True}
+    return _page_adapter.dump_json(page, include=include)
+
+
+def stream_response(stream: Stream, status_code: int = 200) -> Response:
+    return Response(content=stream_json(stream), status_code=status_code, media_type="application/json")
+
+
+def stream_page_response(page: StreamPage, fields: Optional[Iterable[str]] = None) -> Response:
+    return Response(content=stream_page_json(page, fields), media_type="application/json")
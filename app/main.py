@@ -1,37 +1,133 @@
+import asyncio
 import os
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from app.adapters.http import stream_router, auth
-from motor.motor_asyncio import AsyncIOMotorClient
 
-from app.infrastructure.db import get_client
+from app.infrastructure.db import create_client, get_db_name, mongo_client_options
+from app.adapters.repo.cached_stream_repository import ChangeStreamInvalidator
+from app.infrastructure.admission import AdmissionMiddleware
+from app.infrastructure.metrics import MetricsMiddleware, MongoCommandMetrics, MongoPoolMetrics, metrics
+from app.infrastructure.security import password_hasher, token_cache
+from app.di import Container, build_container, get_health_monitor
+from app.infrastructure.health import HealthMonitor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+DB_PREPARE_RETRY_SECONDS = float(os.getenv("DB_PREPARE_RETRY_SECONDS", "2"))
+DB_PREPARE_MAX_RETRY_SECONDS = float(os.getenv("DB_PREPARE_MAX_RETRY_SECONDS", "60"))
 
-app.include_router(stream_router.router)
-app.include_router(auth.router)
 
-
-@app.on_event("startup")
-async def startup_db_client():
-    """Verify MongoDB connection on startup"""
+async def _prepare_database(container: Container) -> bool:
+    """Verify the MongoDB connection, ensure indexes and warm up the pool"""
+    db_name = get_db_name()
     try:
-        client = get_client()
-        db_name = os.getenv("DB_NAME", "assignmentdb")
         # Test the connection
-        await client[db_name].command("ping")
+        await container.db.command("ping")
         logger.info(f"✅ Successfully connected to MongoDB database: {db_name}")
+        await container.stream_repo.ensure_indexes()
+        await container.user_repo.ensure_indexes()
+        logger.info("✅ Stream and user indexes ensured")
+        # Concurrent pings check out minPoolSize connections at once, so the
+        # first requests do not pay for TLS handshakes
+        warm = mongo_client_options()["minPoolSize"]
+        await asyncio.gather(*(container.db.command("ping") for _ in range(warm)))
+        logger.info(f"✅ Warmed up {warm} MongoDB connections")
+        return True
     except Exception as e:
         logger.error(f"❌ Failed to connect to MongoDB: {str(e)}")
         logger.error("Please check your MONGO_URI and DB_NAME environment variables")
         # Don't raise here - let the app start and handle errors in health check
         # This allows the container to start even if DB is temporarily unavailable
+        return False
+
+
+async def _finish_database_setup(container: Container, prepared: bool) -> None:
+    """Retry _prepare_database with backoff until indexes are in place, then
+    migrate existing documents, off the startup path"""
+    delay = DB_PREPARE_RETRY_SECONDS
+    while not prepared:
+        logger.warning(f"Retrying MongoDB preparation in {delay:.0f}s")
+        await asyncio.sleep(delay)
+        prepared = await _prepare_database(container)
+        delay = min(delay * 2, DB_PREPARE_MAX_RETRY_SECONDS)
+
+    delay = DB_PREPARE_RETRY_SECONDS
+    while True:
+        try:
+            await container.stream_repo.migrate()
+            logger.info("✅ Stream migrations done")
+            return
+        except Exception as exc:
+            logger.warning(f"Stream migrations failed, retrying in {delay:.0f}s: {exc}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, DB_PREPARE_MAX_RETRY_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A container set before startup (tests, benchmarks) is used as is
+    container = getattr(app.state, "container", None)
+    if container is None:
+        health = HealthMonitor()
+        client = create_client(event_listeners=[MongoCommandMetrics(), MongoPoolMetrics(), *health.listeners()])
+        container = build_container(client, health)
+        app.state.container = container
+    metrics.register_cache("token", token_cache.stats)
+    metrics.register_cache("stream", container.stream_repo.stats)
+    tasks = []
+    # Indexes are normally in place before the first request; if MongoDB is
+    # down at boot, keep trying in the background instead of giving up.
+    # Data migrations always run in the background.
+    if container.client is not None:
+        prepared = await _prepare_database(container)
+        tasks.append(asyncio.create_task(_finish_database_setup(container, prepared)))
+
+    tasks += [asyncio.create_task(container.presence.run()), asyncio.create_task(container.analytics.run())]
+    if container.health is not None and container.db is not None:
+        tasks.append(asyncio.create_task(container.health.run(container.db)))
+    # Opt-in: keeps per-worker stream caches coherent across workers/replicas
+    if container.db is not None and os.getenv("STREAM_CACHE_CHANGE_STREAM", "false").lower() == "true":
+        invalidator = ChangeStreamInvalidator(container.db["streams"], container.stream_repo)
+        tasks.append(asyncio.create_task(invalidator.run()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            # This worker's viewers leave with it; flush their decrements
+            await container.presence.close()
+        except Exception as exc:
+            logger.warning(f"Final presence flush failed: {exc}")
+        try:
+            await container.analytics.close()
+        except Exception as exc:
+            logger.warning(f"Final analytics flush failed: {exc}")
+        password_hasher.shutdown()
+        if container.client is not None:
+            container.client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.include_router(stream_router.router)
+app.include_router(auth.router)
+# Metrics is added last so it is outermost and also times rejected requests
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus text exposition of request, MongoDB and cache metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 
 @app.get("/health/env", tags=["health"])
 async def health_env():
@@ -50,35 +146,46 @@ async def health_env():
     }
 
 
+@app.get("/health/live", tags=["health"])
+async def health_live(health: HealthMonitor | None = Depends(get_health_monitor)):
+    """Liveness: the process and its event loop are responsive"""
+    if health is not None and not health.is_live():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Event loop stalled")
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", tags=["health"])
+async def health_ready(health: HealthMonitor | None = Depends(get_health_monitor)):
+    """Readiness from the cached MongoDB state; never touches the database"""
+    if health is None:
+        return {"status": "ok", "mongo": "not configured"}
+    if not health.is_ready():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=health.snapshot())
+    return {"status": "ok", **health.snapshot()}
+
+
 @app.get("/health/db", tags=["health"])
-async def health_db(
-    client: AsyncIOMotorClient = Depends(get_client)
-):
-    """Health check endpoint for MongoDB connection"""
-    db_name = os.getenv("DB_NAME", "assignmentdb")
+async def health_db(health: HealthMonitor | None = Depends(get_health_monitor)):
+    """Health check endpoint for MongoDB connection, answered from cached state"""
+    db_name = get_db_name()
     mongo_uri = os.getenv("MONGO_URI") or os.getenv("MONGO_URL") or "not set"
-    
-    try:
-        # Test connection with ping command
-        await client[db_name].command("ping")
-        return {
-            "status": "ok",
-            "mongo": "connected",
-            "database": db_name,
-            "uri_set": bool(mongo_uri and mongo_uri != "not set"),
-        }
-    except ValueError as exc:
-        # This catches missing environment variable errors
-        logger.error(f"Configuration error: {str(exc)}")
+
+    if health is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"MongoDB configuration error: {str(exc)}"
+            detail="MongoDB is not configured for this app instance"
         )
-    except Exception as exc:
-        # This catches connection errors
-        logger.error(f"MongoDB connection error: {str(exc)}")
-        error_type = type(exc).__name__
+    if not health.is_ready():
+        logger.error(f"MongoDB connection error: {health.last_ping_error}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"MongoDB unreachable ({error_type}): {str(exc)}"
+            detail=f"MongoDB unreachable: {health.last_ping_error or 'no successful ping yet'}"
         )
+    return {
+        "status": "ok",
+        "mongo": "connected",
+        "database": db_name,
+        "uri_set": bool(mongo_uri and mongo_uri != "not set"),
+        "ping_ms": health.last_ping_ms,
+        "ping_age_seconds": health.snapshot()["ping_age_seconds"],
+    }
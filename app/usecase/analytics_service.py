@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Optional
+
+from app.domain.analytics import BUCKET_SIZE, StatsBucket, StreamStats, StreamStatsRepository, bucket_start
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_FLUSH_INTERVAL_SECONDS", "10"))
+ANALYTICS_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL_SECONDS", "60"))
+
+
+class AnalyticsService:
+    """Hourly stream activity rollups for dashboards.
+
+    StreamService records creates, updates and deletes here. Like presence,
+    they only bump in-process counters; a background flush turns them into
+    one ``$inc`` per dirty hour, and counts from all workers add up. The
+    live/not-live split is a periodic snapshot of two indexed counts stored
+    on the current hour. Reading stats never touches the streams collection.
+    """
+
+    def __init__(
+        self,
+        repo: StreamStatsRepository,
+        flush_interval: float = ANALYTICS_FLUSH_INTERVAL_SECONDS,
+        snapshot_interval: float = ANALYTICS_SNAPSHOT_INTERVAL_SECONDS,
+    ):
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        # bucket start -> counter -> count not flushed yet
+        self._pending: dict[datetime, dict[str, int]] = {}
+        self._last_snapshot_at: Optional[float] = None
+
+    def record(self, counter: str, count: int = 1, at: Optional[datetime] = None) -> None:
+        if count <= 0:
+            return
+        counts = self._pending.setdefault(bucket_start(at or datetime.utcnow()), {})
+        counts[counter] = counts.get(counter, 0) + count
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            await self.repo.increment(pending)
+        except Exception:
+            # Put the counts back so that the next flush retries them
+            for start, counts in pending.items():
+                for counter, count in counts.items():
+                    self.record(counter, count, at=start)
+            raise
+        return len(pending)
+
+    async def snapshot(self) -> None:
+        self._last_snapshot_at = time.monotonic()
+        await self.repo.snapshot_live(datetime.utcnow())
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.flush()
+                if self._last_snapshot_at is None or time.monotonic() - self._last_snapshot_at >= self.snapshot_interval:
+                    await self.snapshot()
+            except Exception as exc:
+                logger.warning(f"Analytics flush failed: {exc}")
+            await asyncio.sleep(self.flush_interval)
+
+    async def close(self) -> None:
+        await self.flush()
+
+    async def stats(self, hours: int = 24) -> StreamStats:
+        """The last ``hours`` buckets including the current one, with empty
+        hours filled in and this worker's unflushed counts added."""
+        until = bucket_start(datetime.utcnow()) + BUCKET_SIZE
+        since = until - hours * BUCKET_SIZE
+        stats = await self.repo.get_stats(since, until)
+        stored = {bucket.start: bucket for bucket in stats.buckets}
+        buckets = []
+        for i in range(hours):
+            start = since + i * BUCKET_SIZE
+            bucket = replace(stored[start]) if start in stored else StatsBucket(start=start)
+            for counter, count in self._pending.get(start, {}).items():
+                setattr(bucket, counter, getattr(bucket, counter) + count)
+            buckets.append(bucket)
+        return replace(stats, buckets=buckets)
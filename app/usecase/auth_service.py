@@ -1,11 +1,31 @@
-from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from typing import Annotated, Optional
 
-from app.domain.user import User, UserRepository
+import jwt
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.domain.user import User, UserAlreadyExists, UserRepository
 from app.infrastructure.security import (
-    hash_password, verify_password, create_access_token, decode_token
+    HasherBusyError, password_hasher, create_access_token, decode_token_cached
 )
 
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Authentication is temporarily overloaded, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
 class AuthService:
     def __init__(self, user_repo: Annotated[UserRepository, Depends()]):
         self.user_repo = user_repo
@@ -14,23 +34,57 @@ class AuthService:
         existing = await self.user_repo.get_by_email(email)
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
-        hashed = hash_password(password)
-        await self.user_repo.add(User(email=email, password_hash=hashed))
+        try:
+            hashed = await password_hasher.hash(password)
+        except HasherBusyError:
+            raise _hasher_busy()
+        try:
+            await self.user_repo.add(User(email=email, password_hash=hashed))
+        except UserAlreadyExists:
+            raise HTTPException(status_code=400, detail="Email already registered")
         return create_access_token({"sub": email})
 
     async def login(self, email: str, password: str) -> str:
         user = await self.user_repo.get_by_email(email)
-        if not user or not verify_password(password, user.password_hash):
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+        except HasherBusyError:
+            raise _hasher_busy()
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        if new_hash:
+            # Stored hash was made with different rounds; upgrade it transparently
+            await self.user_repo.update_password_hash(email, new_hash)
         return create_access_token({"sub": email})
 
     @staticmethod
-    def get_current_user(token: str) -> str:
+    def user_from_token(token: str) -> str:
         try:
-            payload = decode_token(token)
-            email: str | None = payload.get("sub")
-            if email is None:
-                raise HTTPException(status_code=401, detail="Invalid token")
-            return email
+            payload = decode_token_cached(token)
         except jwt.PyJWTError:
-            raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+            raise _invalid_token()
+        email: str | None = payload.get("sub")
+        if email is None:
+            raise _invalid_token()
+        return email
+
+    @staticmethod
+    async def get_current_user(
+        credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    ) -> str:
+        if credentials is None:
+            raise _invalid_token()
+        return AuthService.user_from_token(credentials.credentials)
+
+    @staticmethod
+    def user_from_header_or_query(authorization: str, access_token: Optional[str]) -> str:
+        """For EventSource and WebSocket clients, which cannot set headers: the
+        token may also come as ?access_token=. The header wins if both are set."""
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else access_token
+        return AuthService.user_from_token(token or "")
+
+    @staticmethod
+    async def get_streaming_user(request: Request, access_token: Optional[str] = None) -> str:
+        return AuthService.user_from_header_or_query(request.headers.get("authorization", ""), access_token)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import secrets
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Optional
+
+from app.domain.stream import VIEWER_REPORT_TTL, Stream, StreamRepository, ViewerReport
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_SHARDS = int(os.getenv("PRESENCE_SHARDS", "16"))
+PRESENCE_WINDOW_SECONDS = float(os.getenv("PRESENCE_WINDOW_SECONDS", "30"))
+PRESENCE_FLUSH_INTERVAL_SECONDS = float(os.getenv("PRESENCE_FLUSH_INTERVAL_SECONDS", "5"))
+
+
+@dataclass
+class _Shard:
+    # stream id -> viewer id -> monotonic time of the last heartbeat
+    viewers: dict[str, dict[str, float]] = field(default_factory=dict)
+    # stream id -> heartbeats since the last flush
+    heartbeats: dict[str, int] = field(default_factory=dict)
+    last_heartbeat_at: dict[str, datetime] = field(default_factory=dict)
+    # stream id -> viewer count this worker last wrote to the repository
+    reported: dict[str, int] = field(default_factory=dict)
+
+
+class PresenceService:
+    """Counts concurrent viewers per stream from heartbeats.
+
+    Heartbeats only touch in-process state. A background flusher writes this
+    worker's absolute viewer count for every stream it has viewers on, once
+    per interval, as an entry the worker owns; the stored count is the sum
+    of the entries refreshed within VIEWER_REPORT_TTL. Mongo write load thus
+    depends on the flush interval and not on heartbeat rate, and a worker
+    that dies without flushing stops counting once its entries go stale.
+
+    Viewers are deduplicated per worker only: a viewer whose heartbeats
+    reach several workers is counted once by each until the others expire
+    it. Route heartbeats stickily (by viewer or by stream) for exact counts.
+    """
+
+    def __init__(
+        self,
+        repo: StreamRepository,
+        shards: int = PRESENCE_SHARDS,
+        window: float = PRESENCE_WINDOW_SECONDS,
+        flush_interval: float = PRESENCE_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.repo = repo
+        self.window = window
+        self.flush_interval = flush_interval
+        # Also a Mongo field name, so no dots or dollars
+        self.worker_id = secrets.token_hex(6)
+        self._shards = [_Shard() for _ in range(shards)]
+        if flush_interval * 2 > VIEWER_REPORT_TTL.total_seconds():
+            logger.warning(
+                f"PRESENCE_FLUSH_INTERVAL_SECONDS={flush_interval} leaves little margin before "
+                f"viewer counts expire after {VIEWER_REPORT_TTL.total_seconds()}s"
+            )
+
+    def _shard(self, stream_id: str) -> _Shard:
+        return self._shards[hash(stream_id) % len(self._shards)]
+
+    def heartbeat(self, stream_id: str, viewer_id: str) -> None:
+        shard = self._shard(stream_id)
+        shard.viewers.setdefault(stream_id, {})[viewer_id] = time.monotonic()
+        shard.heartbeats[stream_id] = shard.heartbeats.get(stream_id, 0) + 1
+        shard.last_heartbeat_at[stream_id] = datetime.utcnow()
+
+    def pending_viewers(self, stream_id: str) -> int:
+        shard = self._shard(stream_id)
+        return len(shard.viewers.get(stream_id, ())) - shard.reported.get(stream_id, 0)
+
+    def with_live_count(self, stream: Stream) -> Stream:
+        """Bring this worker's share of a stored count up to date."""
+        pending = self.pending_viewers(stream.id)
+        if not pending:
+            return stream
+        return replace(stream, viewer_count=max(stream.viewer_count + pending, 0))
+
+    def _expire_shard(self, shard: _Shard, cutoff: float) -> None:
+        for stream_id in list(shard.viewers):
+            viewers = shard.viewers[stream_id]
+            for viewer in [viewer for viewer, seen in viewers.items() if seen < cutoff]:
+                del viewers[viewer]
+            if not viewers:
+                del shard.viewers[stream_id]
+
+    async def expire(self, cutoff: Optional[float] = None) -> None:
+        if cutoff is None:
+            cutoff = time.monotonic() - self.window
+        for shard in self._shards:
+            self._expire_shard(shard, cutoff)
+            # Yield between shards so a large sweep does not stall the loop
+            await asyncio.sleep(0)
+
+    async def flush(self) -> int:
+        reports = []
+        for shard in self._shards:
+            heartbeats, shard.heartbeats = shard.heartbeats, {}
+            last_seen, shard.last_heartbeat_at = shard.last_heartbeat_at, {}
+            # Streams still watched are rewritten every time to keep the
+            # entry fresh; ones reported before and now empty get a zero
+            for stream_id in shard.viewers.keys() | shard.reported.keys() | heartbeats.keys():
+                viewers = len(shard.viewers.get(stream_id, ()))
+                if viewers or shard.reported.get(stream_id) or heartbeats.get(stream_id):
+                    reports.append(ViewerReport(
+                        stream_id, viewers, heartbeats.get(stream_id, 0), last_seen.get(stream_id)
+                    ))
+        if reports:
+            try:
+                await self.repo.report_viewers(self.worker_id, reports)
+            except Exception:
+                # Counts are absolute and rebuilt next time; heartbeats are
+                # put back so that the next flush retries them
+                for report in reports:
+                    shard = self._shard(report.stream_id)
+                    shard.heartbeats[report.stream_id] = (
+                        shard.heartbeats.get(report.stream_id, 0) + report.heartbeats
+                    )
+                    if report.last_heartbeat_at is not None:
+                        shard.last_heartbeat_at.setdefault(report.stream_id, report.last_heartbeat_at)
+                raise
+            for report in reports:
+                reported = self._shard(report.stream_id).reported
+                if report.viewers:
+                    reported[report.stream_id] = report.viewers
+                else:
+                    reported.pop(report.stream_id, None)
+        await self.repo.prune_viewers()
+        return len(reports)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.expire()
+                await self.flush()
+            except Exception as exc:
+                logger.warning(f"Presence flush failed: {exc}")
+
+    async def close(self) -> None:
+        """Drop every viewer held by this worker and write its counts as zero."""
+        await self.expire(cutoff=float("inf"))
+        await self.flush()
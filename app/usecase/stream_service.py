@@ -1,10 +1,47 @@
-from app.domain.stream import Stream, StreamRepository
-from datetime import datetime
+from app.domain.stream import (
+    BatchItemResult, Stream, StreamBatchOp, StreamEvent, StreamEventPublisher, StreamPage,
+    StreamRepository,
+)
+from app.usecase.analytics_service import AnalyticsService
+from app.usecase.presence_service import PresenceService
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+
+def _naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    # Stored datetimes are naive UTC; aware ones would not compare with them
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class StreamService:
-    def __init__(self, repo: StreamRepository):
+    def __init__(
+        self,
+        repo: StreamRepository,
+        events: Optional[StreamEventPublisher] = None,
+        analytics: Optional[AnalyticsService] = None,
+        presence: Optional[PresenceService] = None,
+    ):
         self.repo = repo
+        self.events = events
+        self.analytics = analytics
+        self.presence = presence
+
+    def _live(self, stream: Optional[Stream]) -> Optional[Stream]:
+        # Written streams carry the stored viewer count; add the heartbeats
+        # this worker has not flushed yet, as reads do
+        if stream is None or self.presence is None:
+            return stream
+        return self.presence.with_live_count(stream)
+
+    def _publish(self, type_: str, stream_id: str, stream: Optional[Stream] = None) -> None:
+        if self.events is not None:
+            self.events.publish(StreamEvent(type=type_, stream_id=stream_id, stream=stream))
+
+    def _record(self, counter: str, count: int = 1) -> None:
+        if self.analytics is not None:
+            self.analytics.record(counter, count)
 
     async def create_stream(self, title: str, description: str = "") -> Stream:
         stream = Stream(
@@ -15,17 +52,98 @@ class StreamService:
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow(),
         )
-        return await self.repo.create(stream)
+        created = self._live(await self.repo.create(stream))
+        self._publish("created", created.id, created)
+        self._record("created")
+        return created
+
+    async def create_streams(
+        self, items: list[tuple[str, str]], ordered: bool = True
+    ) -> list[BatchItemResult]:
+        now = datetime.utcnow()
+        streams = [
+            Stream(
+                id=None,
+                title=title,
+                description=description,
+                is_live=False,
+                created_at=now,
+                updated_at=now,
+            )
+            for title, description in items
+        ]
+        results = await self.repo.create_many(streams, ordered)
+        for result in results:
+            result.stream = self._live(result.stream)
+            if result.ok:
+                self._publish("created", result.id, result.stream)
+        self._record("created", sum(1 for result in results if result.ok))
+        return results
 
     async def get_stream(self, stream_id: str):
         return await self.repo.get_by_id(stream_id)
 
-    async def list_streams(self):
-        return await self.repo.list_all()
+    async def get_stream_version(self, stream_id: str) -> Optional[Stream]:
+        return await self.repo.get_version(stream_id)
+
+    async def list_streams(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        fields: Optional[list[str]] = None,
+    ) -> StreamPage:
+        return await self.repo.list_page(
+            limit,
+            cursor=cursor,
+            is_live=is_live,
+            created_after=_naive_utc(created_after),
+            created_before=_naive_utc(created_before),
+            fields=fields,
+        )
+
+    async def search_streams(
+        self,
+        query: str,
+        limit: int = 20,
+        mode: str = "text",
+        cursor: Optional[str] = None,
+        is_live: Optional[bool] = None,
+    ) -> StreamPage:
+        return await self.repo.search(query, limit, mode=mode, cursor=cursor, is_live=is_live)
+
+    def export_streams(self, batch_size: int = 1000) -> AsyncIterator[Stream]:
+        return self.repo.iter_all(batch_size)
 
     async def update_stream(self, stream_id: str, data: dict):
         data["updated_at"] = datetime.utcnow()
-        return await self.repo.update(stream_id, data)
+        updated = self._live(await self.repo.update(stream_id, data))
+        if updated:
+            self._publish("updated", stream_id, updated)
+            self._record("updated")
+        return updated
+
+    async def modify_streams(
+        self, ops: list[StreamBatchOp], ordered: bool = False
+    ) -> list[BatchItemResult]:
+        now = datetime.utcnow()
+        for op in ops:
+            if op.op == "update":
+                op.data = {**(op.data or {}), "updated_at": now}
+        results = await self.repo.bulk_modify(ops, ordered)
+        for op, result in zip(ops, results):
+            result.stream = self._live(result.stream)
+            if result.ok:
+                kind = "updated" if op.op == "update" else "deleted"
+                self._publish(kind, op.stream_id, result.stream)
+                self._record(kind)
+        return results
 
     async def delete_stream(self, stream_id: str):
-        return await self.repo.delete(stream_id)
+        deleted = await self.repo.delete(stream_id)
+        if deleted:
+            self._publish("deleted", stream_id)
+            self._record("deleted")
+        return deleted
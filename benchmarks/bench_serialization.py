@@ -0,0 +1,77 @@
+"""Per-item cost of serializing Stream responses.
+
+Compares FastAPI's response_model path (validate every item, then
+serialize, then json.dumps in JSONResponse) with the precompiled
+TypeAdapter path in app.infrastructure.serialization.
+
+    python -m benchmarks.bench_serialization --items 1000 --rounds 50
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.domain.stream import Stream, StreamPage
+from app.infrastructure.serialization import stream_page_json
+
+
+def make_streams(count: int) -> list[Stream]:
+    now = datetime.utcnow()
+    return [
+        Stream(
+            id=f"{i:024x}",
+            title=f"Stream {i}",
+            description="Benchmark stream " * 4,
+            is_live=i % 3 == 0,
+            created_at=now - timedelta(seconds=i),
+            updated_at=now,
+            viewer_count=i % 100,
+        )
+        for i in range(count)
+    ]
+
+
+async def response_model_path(field, streams: list[Stream]) -> bytes:
+    content = await serialize_response(field=field, response_content=streams)
+    return JSONResponse(content).body
+
+
+def adapter_path(streams: list[Stream]) -> bytes:
+    return stream_page_json(StreamPage(items=streams, next_cursor=None))
+
+
+def timed(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    streams = make_streams(args.items)
+    field = create_model_field(name="Response", type_=List[Stream], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    before = timed(lambda: loop.run_until_complete(response_model_path(field, streams)), args.rounds)
+    after = timed(lambda: adapter_path(streams), args.rounds)
+    loop.close()
+
+    per_item = 1e6 / (args.items * args.rounds)
+    print(f"items={args.items} rounds={args.rounds}")
+    print(f"response_model : {before * per_item:8.2f} us/item")
+    print(f"TypeAdapter    : {after * per_item:8.2f} us/item")
+    print(f"speedup        : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
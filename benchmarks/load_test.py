@@ -0,0 +1,197 @@
+"""In-process load test of the real FastAPI app on in-memory repositories.
+
+Drives app.main.app through httpx's ASGI transport, so no network and no
+MongoDB are involved: what is measured is routing, auth, dependencies,
+services and serialization. Requires httpx (pip install httpx).
+
+    python -m benchmarks.load_test --requests 2000 --concurrency 32 --json out.json
+    python -m benchmarks.load_test --compare out.json   # rerun and diff
+
+Per scenario it reports throughput, latency percentiles, gen-0 GC runs per
+1k requests (a cheap proxy for allocation churn, measured during the timed
+pass) and, with --alloc, bytes allocated at peak and retained per request
+from a separate tracemalloc pass so tracing does not distort latency.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+from itertools import count
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.di import build_in_memory_container
+from app.main import app
+
+SCENARIOS = ("login", "create", "get", "list", "update", "delete")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_requests(
+    total: int, concurrency: int, call: Callable[[int], Awaitable[httpx.Response]]
+) -> tuple[list[float], dict[int, int]]:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    counter = count()
+
+    async def worker():
+        while (i := next(counter)) < total:
+            start = time.perf_counter()
+            response = await call(i)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses
+
+
+class Bench:
+    def __init__(self, client: httpx.AsyncClient, requests: int, concurrency: int):
+        self.client = client
+        self.requests = requests
+        self.concurrency = concurrency
+        self.headers: dict[str, str] = {}
+        self.ids: list[str] = []
+
+    async def setup(self) -> None:
+        response = await self.client.post("/auth/signup", json={"email": "bench@example.com", "password": "bench"})
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def call_for(self, scenario: str) -> Callable[[int], Awaitable[httpx.Response]]:
+        client, headers = self.client, self.headers
+        if scenario == "login":
+            return lambda i: client.post("/auth/login", json={"email": "bench@example.com", "password": "bench"})
+        if scenario == "create":
+            async def create(i):
+                response = await client.post("/streams/", params={"title": f"Stream {i}"}, headers=headers)
+                if response.status_code == 200:
+                    self.ids.append(response.json()["id"])
+                return response
+            return create
+        if scenario == "get":
+            return lambda i: client.get(f"/streams/{self.ids[i % len(self.ids)]}", headers=headers)
+        if scenario == "list":
+            return lambda i: client.get("/streams/", params={"limit": 50}, headers=headers)
+        if scenario == "update":
+            return lambda i: client.put(
+                f"/streams/{self.ids[i % len(self.ids)]}", json={"is_live": i % 2 == 0}, headers=headers
+            )
+        if scenario == "delete":
+            return lambda i: client.delete(f"/streams/{self.ids[i]}", headers=headers)
+        raise ValueError(scenario)
+
+    async def measure(self, scenario: str, alloc: bool) -> dict:
+        total = min(self.requests, len(self.ids)) if scenario == "delete" else self.requests
+        gen0_before = gc.get_stats()[0]["collections"]
+        started = time.perf_counter()
+        latencies, statuses = await run_requests(total, self.concurrency, self.call_for(scenario))
+        elapsed = time.perf_counter() - started
+        gen0 = gc.get_stats()[0]["collections"] - gen0_before
+        latencies.sort()
+        result = {
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "gc_gen0_per_1k": gen0 * 1000 / total if total else 0.0,
+            "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        }
+        if alloc and scenario in ("login", "get", "list", "update"):
+            sample = max(total // 10, 1)
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+            await run_requests(sample, self.concurrency, self.call_for(scenario))
+            after, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result["peak_bytes_per_req"] = (peak - before) / sample
+            result["retained_bytes_per_req"] = (after - before) / sample
+        return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    # httpx logs every request at INFO, which app.main enables
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    app.state.container = build_in_memory_container()
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            bench = Bench(client, args.requests, args.concurrency)
+            await bench.setup()
+            for scenario in args.scenarios:
+                results[scenario] = await bench.measure(scenario, args.alloc)
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+
+def print_report(report: dict, baseline: dict | None) -> None:
+    print(f"revision={report['revision']} python={report['python']} "
+          f"requests={report['requests']} concurrency={report['concurrency']}")
+    header = f"{'scenario':<8} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'gc0/1k':>7}"
+    if baseline:
+        header += f" {'rps vs ' + baseline['revision']:>16}"
+    print(header)
+    for scenario, result in report["results"].items():
+        line = (f"{scenario:<8} {result['rps']:>9.0f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                f"{result['p99_ms']:>8.2f} {result['gc_gen0_per_1k']:>7.1f}")
+        base = (baseline or {}).get("results", {}).get(scenario)
+        if base and base["rps"]:
+            line += f" {(result['rps'] / base['rps'] - 1) * 100:>+15.1f}%"
+        print(line)
+        if "peak_bytes_per_req" in result:
+            print(f"{'':<8} peak {result['peak_bytes_per_req']:.0f} B/req, "
+                  f"retained {result['retained_bytes_per_req']:.0f} B/req")
+        non_ok = {code: n for code, n in result["statuses"].items() if not code.startswith("2")}
+        if non_ok:
+            print(f"{'':<8} non-2xx: {non_ok}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--alloc", action="store_true", help="add a tracemalloc pass per scenario")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file from an earlier run to diff against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report = asyncio.run(run(args))
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
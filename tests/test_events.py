@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from app.di import build_in_memory_container
+from app.domain.stream import StreamBatchOp, StreamEvent
+from app.infrastructure.events import InMemoryEventBroker, SubscriptionClosed
+from app.main import app
+
+
+def _event(type_: str, stream_id: str) -> StreamEvent:
+    return StreamEvent(type=type_, stream_id=stream_id)
+
+
+async def _drain(subscription) -> list[StreamEvent]:
+    events = []
+    while True:
+        try:
+            events.append(await asyncio.wait_for(subscription.get(), 0.05))
+        except asyncio.TimeoutError:
+            return events
+
+
+def test_newer_event_replaces_undelivered_one_for_the_same_stream():
+    async def scenario():
+        broker = InMemoryEventBroker()
+        with broker.subscribe() as subscription:
+            broker.publish(_event("created", "a"))
+            broker.publish(_event("updated", "b"))
+            broker.publish(_event("deleted", "a"))
+            return await _drain(subscription)
+
+    events = asyncio.run(scenario())
+    assert [(event.type, event.stream_id) for event in events] == [("deleted", "a"), ("updated", "b")]
+
+
+def test_subscription_only_receives_requested_streams():
+    async def scenario():
+        broker = InMemoryEventBroker()
+        with broker.subscribe(["b"]) as subscription:
+            broker.publish(_event("updated", "a"))
+            broker.publish(_event("updated", "b"))
+            return await _drain(subscription)
+
+    assert [event.stream_id for event in asyncio.run(scenario())] == ["b"]
+
+
+def test_slow_consumer_is_dropped():
+    async def scenario():
+        broker = InMemoryEventBroker(max_pending=2)
+        subscription = broker.subscribe()
+        for stream_id in ("a", "b", "c"):
+            broker.publish(_event("updated", stream_id))
+        assert subscription.dropped
+        assert broker.subscriber_count == 0
+        with pytest.raises(SubscriptionClosed):
+            await subscription.get()
+        # Other subscribers keep receiving events
+        with broker.subscribe() as healthy:
+            broker.publish(_event("updated", "d"))
+            assert [event.stream_id for event in await _drain(healthy)] == ["d"]
+
+    asyncio.run(scenario())
+
+
+def test_service_writes_are_delivered_without_mongo():
+    async def scenario():
+        container = build_in_memory_container()
+        with container.event_broker.subscribe() as subscription:
+            stream = await container.stream_service.create_stream("Launch")
+            await container.stream_service.update_stream(stream.id, {"title": "Launch day"})
+            return stream.id, await _drain(subscription)
+
+    stream_id, events = asyncio.run(scenario())
+    assert [(event.type, event.stream_id, event.stream.title) for event in events] == [
+        ("updated", stream_id, "Launch day")
+    ]
+
+
+async def _sse_status(query: str) -> tuple[int, dict[str, str]]:
+    """Status and headers of GET /streams/events; disconnects right after
+    the headers because the body never ends."""
+    sent = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        while not sent:
+            await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/streams/events", "raw_path": b"/streams/events", "query_string": query.encode(),
+        "headers": [], "client": ("test", 1), "server": ("test", 80), "root_path": "", "app": app,
+    }
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    headers = {key.decode(): value.decode() for key, value in sent[0]["headers"]}
+    return sent[0]["status"], headers
+
+
+def test_sse_accepts_token_in_query_string():
+    async def scenario():
+        app.state.container = build_in_memory_container()
+        try:
+            async with app.router.lifespan_context(app):
+                token = await app.state.container.auth_service.signup("sse@example.com", "pw")
+                return [await _sse_status(query) for query in ("", "access_token=not-a-token", f"access_token={token}")]
+        finally:
+            del app.state.container
+
+    (missing, _), (invalid, _), (ok, headers) = asyncio.run(scenario())
+    assert (missing, invalid, ok) == (401, 401, 200)
+    assert headers["content-type"].startswith("text/event-stream")
+
+
+def test_written_streams_include_unflushed_viewers():
+    async def scenario():
+        container = build_in_memory_container()
+        service = container.stream_service
+        stream = await service.create_stream("Launch")
+        container.presence.heartbeat(stream.id, "viewer-1")
+        container.presence.heartbeat(stream.id, "viewer-2")
+        with container.event_broker.subscribe() as subscription:
+            updated = await service.update_stream(stream.id, {"title": "Launch day"})
+            ops = [StreamBatchOp(op="update", stream_id=stream.id, data={"is_live": True})]
+            [result] = await service.modify_streams(ops)
+            [event] = await _drain(subscription)
+        return updated, result, event
+
+    updated, result, event = asyncio.run(scenario())
+    assert updated.viewer_count == result.stream.viewer_count == event.stream.viewer_count == 2